@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# # Batch run
+#
+# Make every map, chart and table listed in a job file, in one headless
+# process. The case data and boundaries are loaded once and shared by all
+# the products, so a nightly refresh is one command.
+#
+"""
+Useage:
+    python covid19_batch.py nightly_job.json
+    python covid19_batch.py nightly_job.json --workers 8 --output-dir /tmp/FIGURES
+    python covid19_batch.py nightly_job.json --dry-run   # check the job, load nothing
+
+Job file (JSON), e.g. nightly_job.json (runs on the bundled data):
+    {
+    "output_dir": "FIGURES",
+    "workers": 4,
+    "cases": "phe",
+    "geometry": "districts",
+    "dates": {"start": "2020-03-07", "end": "2020-03-24"},
+    "regions": [
+        {"name": "London", "xlim": [-0.6, 0.5], "ylim": [51.3, 51.7], "date_loc": [0.25, 51.65]}
+        ],
+    "products": [
+        {"product": "frames", "reuse_figure": true, "manifest": true},
+        {"product": "animation", "movie": "gif", "cube": true},
+        {"product": "growth_table"}
+        ]
+    }
+
+output_dir - where everything is saved (default FIGURES)
+workers    - processes drawing map frames (default 1)
+cases      - phe: load_covid() (bundled DATA/Covid-19), tomwhite: load_tomwhite_covid()
+geometry   - districts: load_shapefile_old() (bundled DATA/shapefile), counties: load_shapefile()
+             (needs the full resolution DATA/shapefile3, not bundled)
+dates      - first and last day (YYYY-mm-dd) to use. Either can be left out.
+regions    - map views, as for plot_frames_to_file()
+
+Products. Map products use every region unless given "regions": [names].
+frames         - a PNG per region and day. "days": "last" for the last day only.
+                 Options reuse_figure, raster, lod and manifest, as for plot_frames_to_file()
+animation      - FIGURES/COVID-19_<region>.<movie>. Options movie (gif, mp4),
+                 cube, reuse_figure, raster and lod, as for plot_frames_to_file()
+doubling_rates - doubling_rate_England.png (see extract_timeseries)
+growth_table   - growth rates and doubling times per area and day, as CSV
+                 ("file", default growth_rates.csv; "window", default 7). Needs no boundaries.
+uk_totals      - uk_totals.png (see double_rate_uk_totals). Needs no case or boundary data,
+                 but downloads the UK totals, so needs the network (or a cached copy).
+
+Maps are drawn with the non-interactive Agg backend. A product that fails is
+reported and the rest still run. So are products whose inputs fail to load
+(e.g. a missing shapefile fails every map product, but not growth_table).
+The exit status is 1 if any failed.
+
+**changelog**::
+
+One process for a nightly refresh: job file, data loaded once, Agg backend
+"""
+
+import os
+import sys
+import json
+import argparse
+import datetime
+import traceback
+
+os.environ['MPLBACKEND'] = 'Agg' # headless, also for frame workers. Set before matplotlib is imported
+
+import covid19_fns as c19
+
+# Products --> the inputs they need from load_inputs(): 'cases', 'geometry' (cases and boundaries) or None
+PRODUCTS = {
+    'frames': 'geometry',
+    'animation': 'geometry',
+    'doubling_rates': 'geometry',
+    'growth_table': 'cases',
+    'uk_totals': None,
+    }
+# Options each product accepts, besides "product" and "regions"
+PRODUCT_OPTIONS = {
+    'frames': ['days', 'reuse_figure', 'raster', 'lod', 'manifest'],
+    'animation': ['movie', 'cube', 'reuse_figure', 'raster', 'lod'],
+    'doubling_rates': [],
+    'growth_table': ['file', 'window'],
+    'uk_totals': [],
+    }
+# Case tables and boundaries a job can use: name --> covid19_fns loader
+CASES = {'phe': 'load_covid', 'tomwhite': 'load_tomwhite_covid'}
+GEOMETRY = {'counties': 'load_shapefile', 'districts': 'load_shapefile_old'}
+
+
+def read_job(fname, workers=None, output_dir=None):
+    """
+    Read and check a job file, filling in the defaults. workers and
+    output_dir override the file's values. Raises ValueError for anything
+    unknown, before any data are loaded.
+        job = read_job('nightly_job.json')
+    """
+    with open(fname) as f:
+        job = json.load(f)
+
+    job.setdefault('output_dir', c19.FIGURES_DIR)
+    job.setdefault('workers', 1)
+    job.setdefault('cases', 'phe')
+    job.setdefault('geometry', 'counties')
+    job.setdefault('dates', {})
+    job.setdefault('regions', [])
+    if workers is not None:
+        job['workers'] = workers
+    if output_dir is not None:
+        job['output_dir'] = output_dir
+
+    if job['cases'] not in CASES:
+        raise ValueError('%s: unknown cases %r. Use one of %s'%(fname, job['cases'], ', '.join(CASES)))
+    if job['geometry'] not in GEOMETRY:
+        raise ValueError('%s: unknown geometry %r. Use one of %s'%(fname, job['geometry'], ', '.join(GEOMETRY)))
+    for key in job['dates']:
+        if key not in ('start', 'end'):
+            raise ValueError('%s: unknown dates key %r. Use start and end'%(fname, key))
+        datetime.datetime.strptime(job['dates'][key], '%Y-%m-%d') # raises ValueError if badly formed
+    names = [region['name'] for region in job['regions']]
+    if not job.get('products'):
+        raise ValueError('%s: no products'%fname)
+
+    for product in job['products']:
+        kind = product.get('product')
+        if kind not in PRODUCTS:
+            raise ValueError('%s: unknown product %r. Use one of %s'%(fname, kind, ', '.join(PRODUCTS)))
+        for key in product:
+            if key not in ['product', 'regions'] + PRODUCT_OPTIONS[kind]:
+                raise ValueError('%s: %s has no option %r'%(fname, kind, key))
+        for name in product.get('regions', []):
+            if name not in names:
+                raise ValueError('%s: %s asks for region %r, not in the job regions %s'%(fname, kind, name, names))
+        if kind in ('frames', 'animation') and not names:
+            raise ValueError('%s: %s needs regions'%(fname, kind))
+    return job
+
+
+def select_days(columns, dates):
+    """
+    The day columns of a case table from dates['start'] to dates['end']
+    (YYYY-mm-dd, either can be left out)
+    """
+    days = list(columns)
+    if 'start' in dates:
+        start = datetime.datetime.strptime(dates['start'], '%Y-%m-%d')
+        days = [day for day in days if day >= start]
+    if 'end' in dates:
+        end = datetime.datetime.strptime(dates['end'], '%Y-%m-%d')
+        days = [day for day in days if day <= end]
+    if not days:
+        raise ValueError('No case data between %s and %s'%(dates.get('start', 'the start'), dates.get('end', 'the end')))
+    return days
+
+
+def load_inputs(job):
+    """
+    Load the case table and boundaries once, for all the job's products.
+    Only what the products need is loaded (and imported): a job of
+    growth_table and uk_totals never reads a shapefile.
+    Returns {'cases', 'days', 'geodf', 'errors'}, with None for anything not
+    needed. An input that fails to load is reported and left None, and
+    errors maps it ('cases' or 'geometry') to the reason, so the products
+    that need it can be failed and the rest still run.
+    """
+    needs = set(PRODUCTS[product['product']] for product in job['products'])
+    inputs = {'cases': None, 'days': None, 'geodf': None, 'errors': {}}
+
+    if 'cases' in needs or 'geometry' in needs:
+        try:
+            cases = getattr(c19, CASES[job['cases']])()
+            inputs['days'] = select_days(cases.columns, job['dates'])
+            inputs['cases'] = cases[inputs['days']]
+            print('Cases for %d areas, %s to %s'%(len(cases), inputs['days'][0].strftime('%Y-%m-%d'),
+                                                    inputs['days'][-1].strftime('%Y-%m-%d')))
+        except Exception as err:
+            traceback.print_exc()
+            reason = 'could not load %s cases: %s'%(job['cases'], err)
+            inputs['errors'] = {'cases': reason, 'geometry': reason} # maps need the cases too
+
+    if 'geometry' in needs and 'geometry' not in inputs['errors']:
+        try:
+            shp = getattr(c19, GEOMETRY[job['geometry']])()
+            with c19.timed('join cases to geometry'):
+                # every boundary is kept: areas with no cases are drawn as missing
+                inputs['geodf'] = shp.join(inputs['cases'])
+        except Exception as err:
+            traceback.print_exc()
+            inputs['errors']['geometry'] = 'could not load %s boundaries: %s'%(job['geometry'], err)
+    return inputs
+
+
+def close_figures():
+    """
+    Close figures left open by a product. pyplot is only imported by the
+    products that draw.
+    """
+    if 'matplotlib.pyplot' in sys.modules:
+        sys.modules['matplotlib.pyplot'].close('all')
+    return
+
+
+def run_product(product, job, inputs):
+    """
+    Make one product. Returns the files written.
+    """
+    kind = product['product']
+    names = product.get('regions', [region['name'] for region in job['regions']])
+    regions = [region for region in job['regions'] if region['name'] in names]
+
+    if kind in ('frames', 'animation'):
+        days = inputs['days']
+        if product.get('days', 'all') == 'last':
+            days = days[-1:]
+        options = dict((key, product[key]) for key in PRODUCT_OPTIONS[kind] if key in product and key != 'days')
+        if kind == 'animation':
+            options.setdefault('movie', 'gif')
+        files = c19.plot_frames_to_file(inputs['geodf'], regions, days, nworkers=job['workers'], **options)
+        return [fname for region_files in files.values() for fname in region_files]
+
+    if kind == 'doubling_rates':
+        c19.extract_timeseries(inputs['geodf'], inputs['days'])
+        return [os.path.join(job['output_dir'], 'doubling_rate_England.png')]
+
+    if kind == 'growth_table':
+        growth = c19.growth_analysis(inputs['cases'], inputs['days'], window=product.get('window', 7))
+        fname = os.path.join(job['output_dir'], product.get('file', 'growth_rates.csv'))
+        print('Saving %s'%fname)
+        growth.to_csv(fname, index=False)
+        return [fname]
+
+    if kind == 'uk_totals':
+        c19.double_rate_uk_totals()
+        return [os.path.join(job['output_dir'], 'uk_totals.png')]
+
+
+def run_job(job):
+    """
+    Load the inputs once and make every product in turn, into the job's
+    output_dir. Returns the number of products that failed.
+    """
+    os.makedirs(job['output_dir'], exist_ok=True)
+    c19.settings.FIGURES_DIR = job['output_dir']
+    os.environ['COVID19_FIGURES_DIR'] = job['output_dir'] # for frame workers that import covid19_fns afresh
+
+    inputs = load_inputs(job)
+
+    failed = []
+    nproducts = len(job['products'])
+    for i, product in enumerate(job['products']):
+        kind = product['product']
+        print('Product %d of %d: %s'%(i+1, nproducts, kind))
+        if PRODUCTS[kind] in inputs['errors']:
+            print('Failed %s: %s'%(kind, inputs['errors'][PRODUCTS[kind]]))
+            failed.append(kind)
+            continue
+        try:
+            with c19.timed('product '+kind):
+                files = run_product(product, job, inputs)
+            print('%s: %d files'%(kind, len(files)))
+        except Exception:
+            traceback.print_exc()
+            print('Failed %s'%kind)
+            failed.append(kind)
+        close_figures()
+
+    if failed:
+        print('%d of %d products failed: %s'%(len(failed), nproducts, ', '.join(failed)))
+    return len(failed)
+
+
+##########################################################################################################################
+## Now do the main routine stuff
+if __name__ == '__main__':
+    c19.profile_script('covid19_batch') # COVID19_PROFILE=1 to profile the run
+
+    parser = argparse.ArgumentParser(description='Make the maps, charts and tables listed in a job file')
+    parser.add_argument('job', help='job file (JSON)')
+    parser.add_argument('--workers', type=int, help="processes for map frames (overrides the job's workers)")
+    parser.add_argument('--output-dir', help="where to save the products (overrides the job's output_dir)")
+    parser.add_argument('--dry-run', action='store_true', help='check the job file and list the products')
+    args = parser.parse_args()
+
+    job = read_job(args.job, workers=args.workers, output_dir=args.output_dir)
+    if args.dry_run:
+        for product in job['products']:
+            print('%-15s %s'%(product['product'], json.dumps(product)))
+        sys.exit(0)
+
+    sys.exit(1 if run_job(job) else 0)
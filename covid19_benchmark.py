@@ -0,0 +1,429 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# # Benchmarks
+#
+# Time the slow bits of the COVID-19 pipeline on the bundled data and on
+# synthetic, scaled-up data. Runs offline.
+#
+"""
+Useage:
+    python covid19_benchmark.py            # run everything, save and compare with the last commit
+    python covid19_benchmark.py compare    # compare the last two commits benchmarked
+    python covid19_benchmark.py compare 1a2b3c4 5d6e7f8
+
+Results are appended to RESULTS_FILE, one row per benchmark, tagged with the
+git commit (+dirty for uncommitted changes), so runs can be compared commit
+to commit.
+
+**changelog**::
+
+Date parsing: python date_parser per row vs vectorised pd.to_datetime
+Memory: case tables as read/pivoted vs compact int32 counts and categorical areas
+Suite: loaders, geometry, analysis and rendering, stored per commit
+Import time: the lazily imported covid19_fns submodules, from a fresh interpreter
+Rolling fit: checked against np.polyfit, on long and flat series
+"""
+
+import io
+import os
+import sys
+import time
+import shutil
+import tempfile
+import datetime
+import contextlib
+import subprocess
+import traceback
+import numpy as np
+import pandas as pd # read in CSV data
+import geopandas as gpd
+import shapely.geometry
+import matplotlib.pyplot as plt
+
+import covid19_fns as c19
+
+# Benchmark results, one row per (commit, benchmark)
+RESULTS_FILE = os.path.join(c19.CACHE_DIR, 'benchmarks.csv')
+# The full resolution counties shapefile is not bundled. load_geodataframe() is timed if present
+FULL_SHAPEFILE = 'DATA/shapefile3/Counties_and_Unitary_Authorities_December_2017_Full_Clipped_Boundaries_in_UK.shp'
+
+_results = [] # rows for this run, see record()
+
+
+def best_time(fn, repeat=3):
+    """
+    Best wall clock time (s) of repeat calls to fn()
+    """
+    times = []
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def git_commit():
+    """
+    Short hash of the checked out commit, with +dirty if there are
+    uncommitted changes to tracked files
+    """
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                            stderr=subprocess.DEVNULL).strip()
+        dirty = subprocess.call(['git', 'diff', '--quiet', 'HEAD'], stderr=subprocess.DEVNULL) != 0
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('+dirty' if dirty else '')
+
+
+def record(benchmark, seconds, size=''):
+    """
+    Keep a timing (s) for this run. size describes the input, e.g. '400x1000'
+    """
+    print('%-45s %-12s %10.4f'%(benchmark, size, seconds))
+    _results.append({'benchmark': benchmark, 'size': str(size), 'seconds': seconds})
+    return seconds
+
+
+def save_results(fname=None):
+    """
+    Append this run's results to fname (default RESULTS_FILE), tagged with the
+    commit and time
+    """
+    fname = fname or RESULTS_FILE
+    results = pd.DataFrame(_results)
+    results.insert(0, 'commit', git_commit())
+    results.insert(1, 'date', datetime.datetime.now().isoformat(timespec='seconds'))
+    os.makedirs(os.path.dirname(fname) or '.', exist_ok=True)
+    results.to_csv(fname, mode='a', header=not os.path.exists(fname), index=False, na_rep='nan')
+    print('Saved %d results for %s to %s'%(len(results), results['commit'][0], fname))
+    return results
+
+
+def compare_results(base=None, head=None, fname=None):
+    """
+    Table of the best time of each benchmark for two commits and their ratio
+    (head/base, > 1 is slower). Defaults to the last two commits in the
+    results file.
+        compare_results('1a2b3c4', '5d6e7f8')
+    """
+    fname = fname or RESULTS_FILE
+    results = pd.read_csv(fname, dtype={'commit': str, 'size': str}, keep_default_na=False,
+                            na_values={'seconds': ['nan']}) # failed benchmarks, see run_all
+    commits = list(dict.fromkeys(results['commit'])) # in the order they were run
+    if head is None:
+        head = commits[-1]
+    if base is None:
+        earlier = [commit for commit in commits if commit != head]
+        if not earlier:
+            print('Only %s has been benchmarked'%head)
+            return None
+        base = earlier[-1]
+    best = results.groupby(['benchmark', 'size', 'commit'])['seconds'].min().unstack('commit')
+    table = best[[base, head]].dropna()
+    table['ratio'] = table[head]/table[base]
+    print('%-45s %-12s %10s %10s %7s'%('benchmark', 'size', base, head, 'ratio'))
+    for (benchmark, size), row in table.iterrows():
+        print('%-45s %-12s %10.4f %10.4f %7.2f'%(benchmark, size, row[base], row[head], row['ratio']))
+    return table
+
+
+@contextlib.contextmanager
+def cold_caches():
+    """
+    Run with empty snapshot and geometry caches, so loaders do their full
+    work, without touching the real caches
+    """
+    saved = c19.loaders.SNAPSHOT_DIR, c19.geometry.GEOMETRY_DIR
+    tmp = tempfile.mkdtemp()
+    c19.loaders.SNAPSHOT_DIR = os.path.join(tmp, 'snapshots')
+    c19.geometry.GEOMETRY_DIR = os.path.join(tmp, 'geometry')
+    c19.geometry._geometry_memo.clear()
+    try:
+        yield
+    finally:
+        c19.loaders.SNAPSHOT_DIR, c19.geometry.GEOMETRY_DIR = saved
+        c19.geometry._geometry_memo.clear()
+        shutil.rmtree(tmp)
+
+
+@contextlib.contextmanager
+def scratch_dir():
+    """
+    Run in an empty directory with a FIGURES/ folder, so figures saved by the
+    functions being timed don't overwrite the repo's
+    """
+    cwd = os.getcwd()
+    tmp = tempfile.mkdtemp()
+    os.makedirs(os.path.join(tmp, 'FIGURES'))
+    os.chdir(tmp)
+    try:
+        yield
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmp)
+
+
+def synthetic_tomwhite_csv(nrows):
+    """
+    CSV text in the tomwhite long format (Date,Country,AreaCode,Area,TotalCases)
+    with nrows rows. Returned as a string so no disk access is timed.
+    """
+    nareas = 400
+    ndays = nrows // nareas + 1
+    dates = pd.date_range('2020-03-01', periods=ndays).strftime('%Y-%m-%d')
+    codes = ['E%08d'%i for i in range(nareas)]
+    table = pd.DataFrame({'Date': np.repeat(dates, nareas)[:nrows],
+                          'Country': 'England',
+                          'AreaCode': np.tile(codes, ndays)[:nrows],
+                          'Area': np.tile(['Area %d'%i for i in range(nareas)], ndays)[:nrows],
+                          'TotalCases': np.random.randint(0, 5000, nrows)})
+    return table.to_csv(index=False)
+
+
+def bench_date_parsing(nrows_list=(1000, 10000, 100000, 1000000)):
+    """
+    Row-count scaling of the CSV loaders' date parsing: the old per-row
+    strptime date_parser against c19.read_dated_csv()
+    """
+    mydateparser = lambda x: datetime.datetime.strptime(x, "%Y-%m-%d")
+
+    print('Date parsing: per-row date_parser vs vectorised read_dated_csv')
+    print('%10s %12s %12s %8s'%('rows', 'per-row (s)', 'vector (s)', 'speedup'))
+    results = []
+    for nrows in nrows_list:
+        text = synthetic_tomwhite_csv(nrows)
+        def per_row():
+            # As read_csv(..., parse_dates=[0], date_parser=mydateparser) did (date_parser is gone from pandas 2+)
+            data = pd.read_csv(io.StringIO(text), index_col=3)
+            data['Date'] = data['Date'].map(mydateparser)
+            return data
+        t_old = best_time(per_row)
+        t_new = best_time(lambda: c19.read_dated_csv(io.StringIO(text), "%Y-%m-%d", index_col=3))
+        print('%10d %12.4f %12.4f %8.1f'%(nrows, t_old, t_new, t_old/t_new))
+        _results.append({'benchmark': 'read_dated_csv', 'size': str(nrows), 'seconds': t_new})
+        results.append({'rows': nrows, 'per_row': t_old, 'vectorised': t_new})
+    return pd.DataFrame(results)
+
+
+def bench_memory(nrows=1000000, window=7):
+    """
+    Memory held by the case data in its current forms (long table as read,
+    float64 pivot, the rolling fit series derived from it) against the
+    compact forms: int32 counts and a categorical area lookup
+    """
+    text = synthetic_tomwhite_csv(nrows)
+    raw = c19.read_dated_csv(io.StringIO(text), "%Y-%m-%d")
+    pivoted = raw.pivot(index='Date', columns='AreaCode', values='TotalCases').astype(float)
+    areas = raw[['AreaCode', 'Country', 'Area']].drop_duplicates('AreaCode')
+    compact = c19.compact_counts(pivoted)
+    lookup = c19.compact_areas(areas)
+    derived = c19.rolling_loglinear_fit(compact.to_numpy(dtype=float, na_value=np.nan).T, window=window)
+
+    print('Memory: %d rows of long format cases'%nrows)
+    report = c19.memory_report(long_table=raw, pivot_float64=pivoted, areas_object=areas,
+                                compact_int32=compact, areas_category=lookup,
+                                rolling_fits=derived)
+    print('compact / pivot: %.2f'%(report.loc['compact_int32', 'MB']/report.loc['pivot_float64', 'MB']))
+    return report
+
+
+def synthetic_geodataframe(nareas=400, ndays=1000):
+    """
+    nareas square areas on a grid over the UK, with ndays columns of
+    cumulative cases (datetime labels, as load_geodataframe gives)
+    """
+    n = int(np.ceil(np.sqrt(nareas)))
+    x0, y0, dx, dy = -8., 50., 10./n, 9./n
+    boxes = [shapely.geometry.box(x0+i*dx, y0+j*dy, x0+(i+1)*dx, y0+(j+1)*dy)
+                for j in range(n) for i in range(n)][:nareas]
+    days = list(pd.date_range('2020-03-01', periods=ndays))
+    rng = np.random.default_rng(0)
+    cases = np.cumsum(rng.poisson(3, size=(nareas, ndays)), axis=1)
+    geodf = gpd.GeoDataFrame(pd.DataFrame(cases, columns=days, index=['Area %d'%i for i in range(nareas)]),
+                                geometry=boxes, crs="EPSG:4326")
+    return geodf, days
+
+
+def bench_loaders():
+    """
+    load_covid and load_shapefile_old from the bundled DATA, with cold caches
+    (full parse, dissolve, reproject) and warm caches (snapshot / pickle /
+    in-memory memo), and load_geodataframe if its shapefile is present
+    """
+    print('Loaders')
+    with cold_caches():
+        record('load_covid (cold)', best_time(c19.load_covid, repeat=1))
+        record('load_covid (snapshot)', best_time(c19.load_covid))
+        record('load_shapefile_old (cold)', best_time(c19.load_shapefile_old, repeat=1))
+        record('load_shapefile_old (memo)', best_time(c19.load_shapefile_old))
+        c19.geometry._geometry_memo.clear()
+        record('load_shapefile_old (pickle)', best_time(c19.load_shapefile_old, repeat=1))
+
+        days = list(c19.load_covid().columns)
+        if os.path.exists(FULL_SHAPEFILE):
+            record('load_geodataframe (cold)', best_time(lambda: c19.load_geodataframe(days), repeat=1))
+            record('load_geodataframe', best_time(lambda: c19.load_geodataframe(days)))
+        else:
+            print('Skip load_geodataframe: %s is not bundled. Timing the same steps on DATA/shapefile'%FULL_SHAPEFILE)
+            record('load_geodataframe (bundled shapefile)',
+                    best_time(lambda: c19.load_shapefile_old().join(c19.load_covid(), how='inner')))
+    return
+
+
+def bench_analysis(nareas=400, ndays=1000):
+    """
+    find_max_in_region, extract_timeseries and growth_analysis on a
+    synthetic nareas x ndays table
+    """
+    print('Analysis')
+    size = '%dx%d'%(nareas, ndays)
+    geodf, days = synthetic_geodataframe(nareas, ndays)
+    region_Lon = {'name': 'London',  'xlim':[-0.6,0.5], 'ylim':[51.3,51.7], 'date_loc':[0.25,51.65] }
+    region_NW = {'name': 'NW', 'xlim':[-3.4,-1.9], 'ylim':[52.8,53.9], 'date_loc':[-3.35, 53.8] }
+
+    t0 = time.perf_counter()
+    c19.find_max_in_region(geodf, region_NW, days) # builds the spatial index
+    record('find_max_in_region (first)', time.perf_counter() - t0, size)
+    record('find_max_in_region', best_time(lambda: c19.find_max_in_region(geodf, region_Lon, days)), size)
+
+    with scratch_dir():
+        def extract():
+            c19.extract_timeseries(geodf, days)
+            plt.close('all')
+        record('extract_timeseries', best_time(extract, repeat=1), size)
+    record('growth_analysis', best_time(lambda: c19.growth_analysis(geodf, days)), size)
+    return
+
+
+def bench_rolling_fit(nareas=400, ndays=1000, window=7):
+    """
+    rolling_loglinear_fit on a synthetic nareas x ndays table. The slopes are
+    first checked against np.polyfit on one long series with a gap, a
+    plateau and a constant series. A plateau must fit a slope of 0 (doubling
+    time inf, CI spanning 0). Raises ValueError if not.
+    """
+    print('Rolling log-linear fit')
+    ntest = 1000
+    rng = np.random.default_rng(1)
+    counts = np.cumsum(rng.integers(1, 50, (3, ntest)), axis=1).astype(float)
+    counts[0, 100:110] = 0 # missing days
+    counts[1, 600:] = counts[1, 600] # plateau
+    counts[2] = 12345. # constant
+    fit = c19.rolling_loglinear_fit(counts, window)
+    worst = 0.
+    for row in range(3):
+        for end in range(window-1, ntest):
+            y = counts[row, end-window+1:end+1]
+            ok = y > 0
+            if ok.sum() < 2:
+                continue
+            expected = np.polyfit(np.arange(end-window+1, end+1)[ok], np.log(y[ok]), 1)[0]
+            worst = max(worst, abs(fit['growth_rate'][row, end] - expected)/max(abs(expected), 1e-3))
+    print('rolling_loglinear_fit vs np.polyfit: worst error %.1e'%worst)
+    if worst > 1e-9:
+        raise ValueError('rolling_loglinear_fit differs from np.polyfit by %.1e'%worst)
+    for row in (1, 2):
+        flat = dict((key, fit[key][row, -1]) for key in ['growth_rate', 'growth_lo', 'growth_hi', 'doubling_time',
+                                                          'doubling_lo', 'doubling_hi'])
+        if flat['growth_rate'] != 0 or np.isfinite(flat['doubling_time']) or not (flat['growth_lo'] <= 0 <= flat['growth_hi']):
+            raise ValueError('rolling_loglinear_fit on a flat series: %s'%flat)
+
+    size = '%dx%d'%(nareas, ndays)
+    geodf, days = synthetic_geodataframe(nareas, ndays)
+    counts = c19.timeseries_matrix(geodf, days)
+    record('rolling_loglinear_fit', best_time(lambda: c19.rolling_loglinear_fit(counts, window)), size)
+    return
+
+
+def bench_rendering(nframes=3):
+    """
+    Time per frame of single_frame_plot and FrameEngine.plot_frame for the
+    bundled data, for a UK wide and a London view
+    """
+    print('Rendering (per frame)')
+    geodf = c19.load_shapefile_old().join(c19.load_covid(), how='inner')
+    days = [day for day in geodf.columns if isinstance(day, datetime.datetime)][-nframes:]
+    region_UK = {'name': 'UK', 'xlim':[-6,2], 'ylim':[50,56], 'date_loc':[0, 55.5] }
+    region_Lon = {'name': 'London',  'xlim':[-0.6,0.5], 'ylim':[51.3,51.7], 'date_loc':[0.25,51.65] }
+    size = '%d areas'%len(geodf)
+
+    with scratch_dir():
+        for region in [region_UK, region_Lon]:
+            maxval = c19.find_max_in_region(geodf, region, days)
+            c19.single_frame_plot(geodf, days[0], region, maxval) # warm up fonts etc
+            plt.close('all')
+
+            t0 = time.perf_counter()
+            for day in days:
+                c19.single_frame_plot(geodf, day, region, maxval)
+                plt.close('all')
+            record('single_frame_plot %s'%region['name'], (time.perf_counter() - t0)/len(days), size)
+
+            engine = c19.FrameEngine(geodf, region, maxval)
+            t0 = time.perf_counter()
+            for day in days:
+                engine.plot_frame(day)
+            record('FrameEngine.plot_frame %s'%region['name'], (time.perf_counter() - t0)/len(days), size)
+            engine.close()
+    return
+
+
+def bench_import(repeat=5):
+    """
+    Time to import covid19_fns and reach the functions of a product, each from
+    a fresh interpreter: the bare package, a numbers-only run (case loaders and
+    growth analytics), the UK totals chart and the maps. Prints which of
+    geopandas, shapely and matplotlib.pyplot each one pulled in.
+    """
+    print('Import time')
+    heavy = ['geopandas', 'shapely', 'matplotlib.pyplot']
+    cases = [('import covid19_fns', 'pass'),
+             ('import covid19_fns: growth analysis', 'c19.load_tomwhite_covid; c19.growth_analysis'),
+             ('import covid19_fns: double_rate_uk_totals', 'c19.double_rate_uk_totals'),
+             ('import covid19_fns: maps', 'c19.load_geodataframe; c19.plot_frames_to_file')]
+    for name, code in cases:
+        script = ('import sys, time; t0 = time.perf_counter(); import covid19_fns as c19; %s; '
+                  'print(time.perf_counter() - t0, *[m for m in %r if m in sys.modules])'%(code, heavy))
+        times = []
+        for i in range(repeat):
+            out = subprocess.check_output([sys.executable, '-c', script], text=True).split()
+            times.append(float(out[0]))
+        record(name, min(times))
+        print('    imports: %s'%(', '.join(out[1:]) or 'none of '+', '.join(heavy)))
+    return
+
+
+def run_all():
+    """
+    Run every benchmark, save the results and compare with the previous commit.
+    A benchmark that fails is reported and recorded (size 'failed', no time)
+    and the rest still run. Returns the names of those that failed.
+    """
+    failed = []
+    for bench in [bench_import, bench_date_parsing, bench_memory, bench_loaders, bench_analysis, bench_rolling_fit,
+                    bench_rendering]:
+        try:
+            bench()
+        except Exception:
+            traceback.print_exc()
+            print('Failed %s'%bench.__name__)
+            record(bench.__name__, float('nan'), 'failed')
+            failed.append(bench.__name__)
+    save_results()
+    compare_results()
+    if failed:
+        print('%d benchmarks failed: %s'%(len(failed), ', '.join(failed)))
+    return failed
+
+
+##########################################################################################################################
+## Now do the main routine stuff
+if __name__ == '__main__':
+    c19.profile_script('covid19_benchmark') # COVID19_PROFILE=1 to profile the run
+
+    if len(sys.argv) > 1 and sys.argv[1] == 'compare':
+        compare_results(*sys.argv[2:4])
+    else:
+        sys.exit(1 if run_all() else 0)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# # Mapping in Python with geopandas
+#
+# Trying out geopandas to colour shapefile polygons by field values.
+# Here load a UK county council boundary shape file and a table of COVID-19 confirmed cases and plot.
+#
+"""
+
+## Data sources
+
+* shapefiles:
+- Local Authority Districts (December 2017) Super Generalised Clipped Boundaries in Great Britain ``https://geoportal.statistics.gov.uk/datasets/local-authority-districts-december-2017-super-generalised-clipped-boundaries-in-great-britain/geoservice`` (This effectively masks non-metropolitan regions in the PHE covid19 data, as they report over larger regions in the non-metropolitan places.)
+- Local Authority Districts (December 2019) Boundaries UK BUC at 500m ``https://geoportal.statistics.gov.uk/datasets/local-authority-districts-december-2019-boundaries-uk-buc?geometry=-3.947%2C53.302%2C-0.591%2C53.872`` (This matches the PHE reporting regions for all but a couple of the reporting regions).
+
+
+## Building a python environment
+
+To get this to work I build a bespoke python environment:
+
+conda create -n geo_env
+conda activate geo_env
+conda config --env --add channels conda-forge
+conda config --env --set channel_priority strict
+conda install python=3 geopandas jupyter matplotlib numpy seaborn pysal pandas
+
+Then
+conda activate geo_env
+
+Animations are written as gifs with Pillow (installed with matplotlib). If
+ffmpeg is on the PATH it is used instead, and it is needed for .mp4 output:
+conda install ffmpeg
+
+
+**author**: jpolton
+**data**: 11 March 2020
+
+**changelog**::
+
+11 March: did it
+12 March: add subregions
+13 Mar: Broke ipython and spyder. Now just run as python script...
+14 Mar: implement log scaling onto discrete integer values
+16 Mar: generalise timestamp. Add Wales data.
+
+## Layout
+
+covid19_fns is a package of submodules that are only imported when first
+used, so a script pays just for the libraries its products need:
+
+settings  - cache locations and options (imported with the package)
+timing    - stage timings, counters and profile_script() (imported with the package)
+loaders   - case data downloads, snapshots and pivots (numpy, pandas)
+analytics - growth rates and doubling times (numpy, pandas)
+geometry  - boundaries, spatial queries and levels of detail (geopandas, shapely)
+rendering - maps, charts and animations (matplotlib)
+
+Everything is still reached as c19.<name>, e.g.
+    import covid19_fns as c19
+    totals = c19.load_tomwhite_uktotals() # imports loaders: no geopandas, shapely or pyplot
+    c19.single_frame_plot(geodf,date_time,region,maxval) # imports rendering, then geometry
+"""
+
+import importlib
+
+from .settings import (
+    FIGURES_DIR, CACHE_DIR, CACHE_TTL, OFFLINE, SNAPSHOT_DIR, GEOMETRY_DIR, LOD_DIR,
+    LOD_TOLERANCES, LABEL_DIR, FRAME_CUBE_DIR, ARCGIS_DIR, RENDER_MANIFEST,
+    AREA_MERGES, TIMING_REPORT, PROFILE, PROFILE_DIR)
+from .timing import timed, count, timing_report, write_timing_report, profile_script
+
+# Public names of the lazily imported submodules. See __getattr__()
+_submodules = {
+    'loaders': [
+        'seed_cache', 'cached_csv', 'save_table_snapshot', 'load_table_snapshot', 'snapshot_table',
+        'area_merge_map', 'merge_areas', 'read_dated_csv', 'LongTablePivot', 'compact_counts',
+        'compact_areas', 'memory_report', 'read_long_csv_chunks', 'pivot_long_csv',
+        'long_csv_days', 'load_covid', 'load_tomwhite_covid', 'load_tomwhite_uktotals',
+        ],
+    'analytics': [
+        'doubling', 'timeseries_matrix', 'loglinear_fit', 'rolling_loglinear_fit',
+        'rolling_doubling_times', 'growth_analysis', 'doubling_times',
+        ],
+    'geometry': [
+        'TimeChoropleth', 'ArcGISFetcher', 'MockArcGISServer', 'cached_geodataframe',
+        'dissolve_areas', 'load_shapefile_old', 'load_shapefile', 'build_geometry_cache',
+        'load_geodataframe', 'RegionQuery', 'region_query', 'geometry_signature', 'label_grid',
+        'simplify_coverage', 'GeometryLOD', 'geometry_lod', 'find_max_in_region',
+        ],
+    'rendering': [
+        'plot_panel', 'make_colormap', 'frame_filename', 'region_title', 'log_ticks',
+        'ColourScale', 'colour_scale', 'single_frame_plot', 'FrameEngine', 'widgets_thing',
+        'figure_to_rgb', 'find_encoder', 'AnimationWriter', 'FrameGrabber', 'FrameCube', 'FrameSlot', 'make_gif',
+        'plot_logy_with_fit', 'RenderManifest', 'plot_frames_to_file', 'extract_timeseries',
+        'double_rate_uk_totals',
+        ],
+    }
+_lazy_names = {name: module for module, names in _submodules.items() for name in names}
+
+
+def __getattr__(name):
+    """
+    Import the submodule that defines name, on first use (PEP 562). The
+    submodules themselves are reached the same way, e.g. c19.geometry
+    """
+    if name in _submodules:
+        return importlib.import_module('.'+name, __name__)
+    if name not in _lazy_names:
+        raise AttributeError('module %r has no attribute %r'%(__name__, name))
+    value = getattr(importlib.import_module('.'+_lazy_names[name], __name__), name)
+    globals()[name] = value # later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_names) | set(_submodules))
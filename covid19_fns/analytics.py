@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Growth rates and doubling times for every area at once, as array operations
+on the (areas x days) case matrix. Needs numpy and pandas only.
+"""
+
+import numpy as np
+import pandas as pd # read in CSV data
+
+from .timing import timed
+
+## FUNCTIONS
+############################################################################
+
+def doubling(days,doubling_period):
+    """
+    calculate function that doubles every 'doubling_period' days
+    fn(t+dt) = 2.fn(t), for doubling period dt.
+    exp(alpha(t + dt)) = 2.exp(alpha.t)
+    exp(alpha.dt) = 2
+    dt = log 2 / alpha, where alpha is the slope of the straight line of the data in log space.
+
+    If dt = 4 days, alpha = log2/4
+
+    """
+    nt = len(days)
+    fn = np.zeros(nt)*np.nan
+    alpha = np.log(2)/doubling_period
+    for i in range(1,nt):
+        fn[i] = np.e**(i*alpha)
+    return fn
+
+def timeseries_matrix(geodf, days):
+    """
+    (areas x days) array of the values in the day columns of geodf (or any
+    table with areas as rows), taken in one bulk slice. Missing values are NaN.
+    """
+    return geodf[list(days)].astype(float).to_numpy()
+
+
+def loglinear_fit(counts, ndays=None):
+    """
+    Least squares straight line fit of log(counts) against day number, for
+    every row of counts at once. Zero and missing counts are left out of
+    each row's fit. ndays - fit only the last ndays columns.
+        slope, intercept = loglinear_fit(time_series, ndays=7)
+        doubling_time = np.log(2)/slope
+    Rows with fewer than two usable points give NaN.
+    """
+    counts = np.asarray(counts, dtype=float)
+    if ndays is not None:
+        counts = counts[:, -ndays:]
+    n, sx, sy, sxx, sxy, syy = [term.sum(axis=1) for term in _loglinear_terms(counts)]
+    slope, intercept, se = _fit_from_sums(n, sx, sy, sxx, sxy, syy)
+    return slope, intercept
+
+
+def _loglinear_terms(counts):
+    """
+    Per point terms of the least squares sums for log(counts) against day
+    number: 1, x, y, x*x, x*y, y*y. Zero and missing counts contribute nothing.
+    """
+    x = np.arange(counts.shape[-1], dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        y = np.log(np.where(counts > 0, counts, np.nan))
+    ok = ~np.isnan(y)
+    y = np.where(ok, y, 0.)
+    x = np.where(ok, x, 0.)
+    return ok.astype(float), x, y, x*x, x*y, y*y
+
+
+def _fit_from_sums(n, sx, sy, sxx, sxy, syy):
+    """
+    Slope, intercept and slope standard error of a straight line fit, from
+    the least squares sums. Arrays of any (matching) shape.
+    Slope is NaN with fewer than 2 points, its error with fewer than 3.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sxx_c = sxx - sx*sx/n # centred sums
+        sxy_c = sxy - sx*sy/n
+        syy_c = syy - sy*sy/n
+        slope = sxy_c / sxx_c
+        intercept = (sy - slope*sx) / n
+        sse = np.maximum(syy_c - slope*sxy_c, 0.) # residual sum of squares
+        se = np.sqrt( sse/(n-2) / sxx_c )
+    slope = np.where(n >= 2, slope, np.nan)
+    intercept = np.where(n >= 2, intercept, np.nan)
+    se = np.where(n >= 3, se, np.nan)
+    return slope, intercept, se
+
+
+# Two sided 95% points of Student's t for 1-30 degrees of freedom (normal beyond)
+_T975 = np.array([np.nan, 12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+                    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+                    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042])
+
+
+def rolling_loglinear_fit(counts, window=7):
+    """
+    Fit log(counts) against day number in every sliding window of length
+    window, for every row, as whole array operations. The least squares sums
+    are built up over the window's days, for all windows at once, with days
+    counted from the window start and counts relative to the window's
+    largest. The sums stay small, so long series keep their precision and a
+    plateau fits a slope of exactly 0.
+
+    INPUT:
+        counts - (areas x days) array of cumulative counts
+    OUTPUT: dictionary of (areas x days) arrays, indexed by window end day
+        growth_rate, growth_lo, growth_hi - slope of log(counts) per day, 95% CI
+        doubling_time, doubling_lo, doubling_hi - log(2)/slope and its 95% CI (days)
+        npoints - number of usable (non zero) counts in the window
+    Windows ending before day window-1 are NaN, so a series shorter than
+    window gives all NaN:
+        rolling_loglinear_fit(np.ones((2, 3)), window=7)['growth_rate'] --> (2 x 3) of NaN
+    Negative doubling times are halving times. When the slope CI spans zero, the doubling time CI is
+    open ended (inf), and a flat window has doubling time inf and CI (-inf, inf).
+    """
+    counts = np.asarray(counts, dtype=float)
+    nt = counts.shape[1]
+    sums = [np.full(counts.shape, np.nan) for i in range(6)] # n, sx, sy, sxx, sxy, syy
+    if window <= nt: # otherwise no window fits, leave them all NaN
+        with np.errstate(divide='ignore', invalid='ignore'):
+            logc = np.log(np.where(counts > 0, counts, np.nan))
+        nwindows = nt - window + 1
+        top = logc[:, :nwindows].copy() # largest log count in each window
+        for k in range(1, window):
+            np.fmax(top, logc[:, k:k+nwindows], out=top)
+        for total in sums:
+            total[:, window-1:] = 0.
+        n, sx, sy, sxx, sxy, syy = [total[:, window-1:] for total in sums] # views, summed into
+        for k in range(window): # day k of each window
+            y = logc[:, k:k+nwindows] - top
+            ok = ~np.isnan(y)
+            y[~ok] = 0.
+            n += ok
+            sx += k*ok
+            sxx += k*k*ok
+            sy += y
+            sxy += k*y
+            syy += y*y
+    n = sums[0]
+
+    slope, intercept, se = _fit_from_sums(*sums)
+    dof = np.nan_to_num(n - 2, nan=0).astype(int)
+    tval = np.where(dof > 30, 1.96, _T975[np.clip(dof, 0, 30)])
+    slope_lo, slope_hi = slope - tval*se, slope + tval*se
+
+    ln2 = np.log(2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        doubling_time = ln2/slope
+        doubling_lo = ln2/slope_hi
+        doubling_hi = ln2/slope_lo
+    spans_zero = (slope_lo <= 0) & (slope_hi >= 0)
+    doubling_lo = np.where(spans_zero & (slope <= 0), -np.inf, doubling_lo)
+    doubling_hi = np.where(spans_zero & (slope >= 0), np.inf, doubling_hi)
+
+    return {'growth_rate': slope, 'growth_lo': slope_lo, 'growth_hi': slope_hi,
+            'doubling_time': doubling_time, 'doubling_lo': doubling_lo, 'doubling_hi': doubling_hi,
+            'npoints': n}
+
+
+def rolling_doubling_times(geodf, days, window=7):
+    """
+    Rolling doubling time surface for every area: a log-linear fit in each
+    window of window days (see rolling_loglinear_fit). Returns a tidy table
+    with one row per area and window end date.
+
+    Example usage:
+        surface = rolling_doubling_times(geodf, days, window=7)
+        surface.pivot(index='date', columns='area', values='doubling_time')
+    """
+    counts = timeseries_matrix(geodf, days)
+    nn, nt = counts.shape
+    fit = rolling_loglinear_fit(counts, window)
+    table = pd.DataFrame({'area': np.repeat(np.asarray(geodf.index), nt),
+                          'date': np.tile(pd.DatetimeIndex(days), nn)})
+    for key, value in fit.items():
+        table[key] = value.ravel()
+    return table
+
+
+@timed('growth_analysis')
+def growth_analysis(geodf, days, window=7):
+    """
+    Growth analytics for every area at once, as whole array operations on the
+    (areas x days) matrix. Returns a tidy table with one row per area and day:
+        area, date, cases, new_cases - total and daily increment
+        growth_rate   - mean daily growth of log(cases) over the last window days
+        doubling_time - log(2)/growth_rate (days)
+
+    Example usage:
+        growth = growth_analysis(geodf, days)
+        growth[growth['area'] == 'Wirral']
+    See doubling_times() for one log-linear fit per area.
+    """
+    counts = timeseries_matrix(geodf, days)
+    nn, nt = counts.shape
+
+    new_cases = np.full_like(counts, np.nan)
+    new_cases[:, 1:] = np.diff(counts, axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        logc = np.log(np.where(counts > 0, counts, np.nan))
+        growth_rate = np.full_like(counts, np.nan)
+        if nt > window:
+            growth_rate[:, window:] = (logc[:, window:] - logc[:, :-window]) / window
+        doubling_time = np.log(2) / growth_rate
+
+    return pd.DataFrame({'area': np.repeat(np.asarray(geodf.index), nt),
+                         'date': np.tile(pd.DatetimeIndex(days), nn),
+                         'cases': counts.ravel(),
+                         'new_cases': new_cases.ravel(),
+                         'growth_rate': growth_rate.ravel(),
+                         'doubling_time': doubling_time.ravel()})
+
+
+@timed('doubling_times')
+def doubling_times(geodf, days, ndays=None):
+    """
+    Log-linear doubling time per area, from one least squares fit over the
+    last ndays (default: all days). Returns a table indexed by area with
+    columns growth_rate (per day), doubling_time (days) and cases (last day).
+    """
+    counts = timeseries_matrix(geodf, days)
+    slope, intercept = loglinear_fit(counts, ndays)
+    with np.errstate(divide='ignore'):
+        doubling_time = np.log(2)/slope
+    return pd.DataFrame({'growth_rate': slope, 'doubling_time': doubling_time,
+                         'cases': counts[:, -1]}, index=geodf.index)
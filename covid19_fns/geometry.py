@@ -0,0 +1,728 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Boundaries: shapefile loaders, the geometry cache, ArcGIS boundary queries,
+spatial lookups of the areas in a view and simplified levels of detail.
+Needs geopandas and shapely.
+"""
+
+import os
+import json
+import hashlib
+import time
+import urllib.parse # ArcGIS query strings
+import http.client # pooled ArcGIS queries
+import http.server # local stand-in ArcGIS server
+import threading
+import concurrent.futures
+import re
+import numpy as np
+import geopandas as gpd
+import shapely.geometry # region boxes
+import pandas as pd # read in CSV data
+
+from .settings import ARCGIS_DIR, AREA_MERGES, CACHE_TTL, GEOMETRY_DIR, LABEL_DIR, LOD_DIR, LOD_TOLERANCES, OFFLINE
+from .timing import count, timed
+from .loaders import area_merge_map, load_covid, _source_signature
+
+## FUNCTIONS
+############################################################################
+
+class TimeChoropleth:
+    """
+    Values that change by day on a fixed set of regions: one static
+    geodataframe of all the regions plus a dense (days x regions) matrix of
+    values. A day's values are a row lookup, with no concatenation or copying
+    of geometry.
+
+    Example usage:
+        tc = TimeChoropleth(geodf, values, days) # values[i,j]: day i, geodf row j
+        tc.values_on(days[-1])   --> array of values, one per row of geodf
+        tc.frame(days[-1])       --> geodf rows with a value that day, plus a 'value' column
+    """
+
+    def __init__(self, geodf, values, days):
+        self.geodf = geodf
+        self.days = pd.DatetimeIndex(days)
+        self.values = np.asarray(values, dtype=float)
+        if self.values.shape != (len(self.days), len(geodf)):
+            raise ValueError('values shape %s does not match (days, regions) = (%d, %d)'
+                                %(self.values.shape, len(self.days), len(geodf)))
+
+    @classmethod
+    def from_table(cls, geodf, table, days, key=None):
+        """
+        Build from a (Date x code) table of values, e.g. the tomwhite
+        cases table. Each row of geodf takes the values of the column named by
+        its key column (default: its index). Codes missing from the table get NaN.
+        """
+        codes = geodf.index if key is None else geodf[key]
+        values = table.reindex(index=pd.DatetimeIndex(days), columns=codes).astype(float).to_numpy()
+        return cls(geodf, values, days)
+
+    def day_index(self, date_time):
+        return self.days.get_loc(pd.Timestamp(date_time))
+
+    def values_on(self, date_time):
+        """
+        Array of values for date_time, one per row of geodf
+        """
+        return self.values[self.day_index(date_time)]
+
+    def max_in_region(self, region, date_time):
+        """
+        Largest value on date_time among the areas within the region. Uses the
+        memoised spatial query on the static geometry (see RegionQuery).
+        """
+        values = self.values_on(date_time)[ region_query(self.geodf).positions(region) ]
+        values = values[~np.isnan(values)]
+        return values.max() if len(values) > 0 else np.nan
+
+    def frame(self, date_time, dropna=True):
+        """
+        geodataframe for date_time with a 'value' column. With dropna, rows
+        with no value that day are left out.
+        """
+        values = self.values_on(date_time)
+        gdf = self.geodf.assign(value=values)
+        if dropna:
+            gdf = gdf[~np.isnan(values)]
+        return gdf
+
+
+class ArcGISFetcher:
+    """
+    Query ArcGIS REST (MapServer) endpoints for boundary GeoJSON.
+
+    Queries run concurrently on a thread pool. Each thread keeps one
+    keep-alive connection per host, so connections are reused between
+    queries. Every successful response is cached on disk in ARCGIS_DIR (keyed
+    by query url) and is not fetched again, except responses with no features
+    (a mistyped code or a server side hiccup), which are fetched again once
+    they are older than empty_ttl seconds (default CACHE_TTL). offline=True
+    (or COVID19_OFFLINE=1) only uses the cache, whatever its age.
+
+    Example usage:
+        endpoints = [(url_lad19, 'lad19cd'), (url_cty19, 'cty19cd')] # MapServer/0 urls and code fields
+        found = ArcGISFetcher().find_all(['E09000002', 'E10000017'], endpoints)
+        gdf, n = found['E09000002'] # rows for the code, number of the endpoint that had it
+    """
+
+    def __init__(self, nworkers=8, batch_size=50, timeout=60, offline=None, empty_ttl=None):
+        self.nworkers = nworkers
+        self.batch_size = batch_size # codes per query, keeps the url a sensible length
+        self.timeout = timeout
+        self.offline = OFFLINE if offline is None else offline
+        self.empty_ttl = CACHE_TTL if empty_ttl is None else empty_ttl
+        self._local = threading.local()
+
+    def _connection(self, scheme, netloc, fresh=False):
+        """
+        This thread's connection to netloc, made on first use
+        """
+        if not hasattr(self._local, 'connections'):
+            self._local.connections = {}
+        key = (scheme, netloc)
+        if fresh and key in self._local.connections:
+            self._local.connections.pop(key).close()
+        if key not in self._local.connections:
+            if scheme == 'https':
+                self._local.connections[key] = http.client.HTTPSConnection(netloc, timeout=self.timeout)
+            else:
+                self._local.connections[key] = http.client.HTTPConnection(netloc, timeout=self.timeout)
+        return self._local.connections[key]
+
+    def get(self, url):
+        """
+        GET url, as parsed JSON, from the disk cache or the server
+        """
+        fname = os.path.join(ARCGIS_DIR, hashlib.sha1(url.encode('utf-8')).hexdigest()+'.geojson')
+        if os.path.exists(fname):
+            with open(fname) as f:
+                data = json.load(f)
+            if (data.get('features') or self.offline
+                    or time.time() - os.path.getmtime(fname) < self.empty_ttl):
+                return data
+            count('ArcGIS empty responses refetched')
+        elif self.offline:
+            raise IOError('No cached copy of %s (offline mode)'%url)
+
+        parts = urllib.parse.urlsplit(url)
+        for attempt in range(2):
+            # A kept-alive connection may have been dropped by the server: retry once on a new one
+            conn = self._connection(parts.scheme, parts.netloc, fresh=attempt > 0)
+            try:
+                conn.request('GET', parts.path+'?'+parts.query)
+                response = conn.getresponse()
+                body = response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                if attempt > 0:
+                    raise
+        if response.status != 200:
+            raise IOError('HTTP %d from %s'%(response.status, url))
+        data = json.loads(body)
+        if 'error' in data: # ArcGIS reports errors with a 200 status
+            raise IOError('ArcGIS error from %s: %s'%(url, data['error']))
+
+        os.makedirs(ARCGIS_DIR, exist_ok=True)
+        with open(fname+'.part', 'wb') as f:
+            f.write(body)
+        os.replace(fname+'.part', fname)
+        return data
+
+    def query(self, base, key, codes):
+        """
+        GeoJSON features from endpoint base whose key field is one of codes
+        """
+        where = 'UPPER(%s) IN (%s)'%(key, ','.join("'%s'"%c.upper() for c in codes))
+        url = base+'?'+urllib.parse.urlencode({'where': where, 'outFields': '*', 'outSR': '4326', 'f': 'geojson'})
+        return self.get(url).get('features', [])
+
+    @timed('ArcGISFetcher.find_all')
+    def find_all(self, codes, endpoints):
+        """
+        Look up every code in every endpoint at once. For each code, keep the
+        first endpoint (in list order) that has it.
+        INPUT:
+            codes - list of ONS code strings
+            endpoints - list of (MapServer layer url, code field name)
+        OUTPUT:
+            dictionary ONScode: (geodataframe, endpoint number). Codes that are
+            not found are left out.
+        """
+        codes = [str(c) for c in codes]
+        batches = [codes[i:i+self.batch_size] for i in range(0, len(codes), self.batch_size)]
+
+        with concurrent.futures.ThreadPoolExecutor(self.nworkers) as pool:
+            jobs = [[pool.submit(self.query, base, key, batch) for batch in batches]
+                        for base, key in endpoints]
+
+            features = dict() # upper case code: (features, endpoint number)
+            for n, (base, key) in enumerate(endpoints):
+                for job in jobs[n]:
+                    for feature in job.result():
+                        code = str(feature['properties'].get(key, '')).upper()
+                        if code not in features:
+                            features[code] = ([], n)
+                        if features[code][1] == n:
+                            features[code][0].append(feature)
+
+        found = dict()
+        for code in codes:
+            if code.upper() in features:
+                feats, n = features[code.upper()]
+                found[code] = (gpd.GeoDataFrame.from_features(feats, crs="EPSG:4326"), n)
+        return found
+
+
+class MockArcGISServer:
+    """
+    Local stand-in for ArcGIS MapServer query endpoints, so ArcGISFetcher can
+    be run offline. Understands the where clauses the fetcher sends,
+    "UPPER(field) IN ('A','B')" and "UPPER(field) like '%A%'", and answers
+    with GeoJSON.
+
+    Example usage:
+        layers = {'lad19': ('lad19cd', json.loads(gdf.to_json())['features'])}
+        with MockArcGISServer(layers) as server:
+            found = ArcGISFetcher().find_all(codes, [(server.url+'/lad19/MapServer/0/query', 'lad19cd')])
+    layers - dictionary of layer name: (code field, list of GeoJSON features).
+             A layer is served at <server.url>/<name>/MapServer/0/query
+    """
+
+    def __init__(self, layers):
+        self.layers = layers
+        self.nrequests = 0
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1' # keep-alive, as a real server would
+
+            def do_GET(self):
+                server.nrequests = server.nrequests + 1
+                parts = urllib.parse.urlsplit(self.path)
+                name = parts.path.strip('/').split('/')[0]
+                params = urllib.parse.parse_qs(parts.query)
+                if name in server.layers:
+                    key, features = server.layers[name]
+                    where = params.get('where', [''])[0]
+                    codes = set(c.strip('%').upper() for c in re.findall("'([^']*)'", where))
+                    body = json.dumps({'type': 'FeatureCollection', 'features':
+                                [f for f in features if str(f['properties'].get(key, '')).upper() in codes]})
+                    status = 200
+                else:
+                    body = json.dumps({'error': {'code': 400, 'message': 'Invalid URL'}})
+                    status = 200
+                body = body.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/geo+json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:%d'%self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+_geometry_memo = {} # geodataframes already loaded by this process
+GEOMETRY_CACHE_VERSION = 1 # bump when a build() changes, to rebuild the cached geometry
+
+
+def cached_geodataframe(name, shapefile, build, merges=None):
+    """
+    Return the geodataframe made by build() from shapefile, using a binary
+    copy in GEOMETRY_DIR/name.pkl when it is newer than the shapefile. The
+    cache is rebuilt automatically when the .shp file changes (size or
+    modification time), when merges (the AREA_MERGES build() dissolves) or
+    GEOMETRY_CACHE_VERSION change. Loaded frames are also kept in memory, so
+    repeat calls in one run are free. A copy is returned so callers can add
+    columns.
+    """
+    signature = dict(_source_signature(shapefile), version=GEOMETRY_CACHE_VERSION, merges=merges)
+    signature = json.loads(json.dumps(signature)) # as it reads back from the .json
+    if name in _geometry_memo and _geometry_memo[name][0] == signature:
+        return _geometry_memo[name][1].copy()
+
+    fname = os.path.join(GEOMETRY_DIR, name+'.pkl')
+    meta = None
+    if os.path.exists(fname) and os.path.exists(fname+'.json'):
+        with open(fname+'.json') as f:
+            meta = json.load(f)
+
+    if meta == signature:
+        print('Load cached geometry %s for %s'%(fname, shapefile))
+        count('geometry cache hits')
+        shp = pd.read_pickle(fname)
+    else:
+        with timed('build geometry %s (read, dissolve, reproject)'%name):
+            shp = build()
+        os.makedirs(GEOMETRY_DIR, exist_ok=True)
+        shp.to_pickle(fname)
+        with open(fname+'.json', 'w') as f:
+            json.dump(signature, f)
+
+    _geometry_memo[name] = (signature, shp)
+    return shp.copy()
+
+
+@timed('dissolve areas')
+def dissolve_areas(shp, name_col, merges=AREA_MERGES):
+    """
+    Dissolve the boundary polygons of the areas in merges into one polygon
+    per merged area, named in name_col. Other columns come from the first
+    part. Areas not in merges are left as they are.
+        shp = dissolve_areas(gpd.read_file(shapefile), 'ctyua17nm')
+    """
+    mapping = area_merge_map(merges)
+    is_part = shp[name_col].isin(list(mapping))
+    parts = shp[is_part].assign(**{name_col: shp.loc[is_part, name_col].map(mapping)})
+    merged = parts.dissolve(by=name_col, as_index=False)[shp.columns]
+    return gpd.GeoDataFrame(pd.concat([shp[~is_part], merged], ignore_index=True), crs=shp.crs)
+
+
+def load_shapefile_old():
+    """
+    load Local Authorities Upper Tier shape file data
+    Example usage of data:
+    shp.lad17nm[shp.lad17nm == 'Wirral']
+
+    The merged, reprojected result is cached (see cached_geodataframe)
+    """
+    # Load shape file data
+    shapefile = 'DATA/shapefile/Local_Authority_Districts_December_2017_Super_Generalised_Clipped_Boundaries_in_Great_Britain.shp'
+    # Join Hackney and City of London. The districts file keeps the other merged areas apart
+    merges = {'Hackney and City of London': AREA_MERGES['Hackney and City of London']}
+
+    def build():
+        # Read the data
+        print('Load shapefile data from %s'%shapefile)
+        shp = gpd.read_file(shapefile)
+
+        shp3 = dissolve_areas(shp, 'lad17nm', merges)
+
+        # Set index to be the regional name
+        shp3 = shp3.set_index('lad17nm')
+
+        # Before plotting the data, first change the Coordinate Reference System to one that uses degrees, for plotting ease
+        #imd = imd.to_crs("EPSG:3395") # metres
+        shp3 = shp3.to_crs("EPSG:4326") # degrees
+        #print(shp.crs)
+        return shp3
+
+    return cached_geodataframe('lad17_super_generalised', shapefile, build, merges)
+
+def load_shapefile():
+    """
+    load Local Authorities Upper Tier shape file data.
+    Do some merging and postprocessing to match COVID19 data as best as possible.
+    Example usage of data:
+    shp.lad19nm[shp.lad19nm == 'Wirral']
+
+    The merged, reprojected result is cached (see cached_geodataframe), so the
+    slow read, dissolve and to_crs only happen when the .shp file changes.
+    """
+    # Load shape file data
+    shapefile = 'DATA/shapefile3/Counties_and_Unitary_Authorities_December_2017_Full_Clipped_Boundaries_in_UK.shp'
+
+    def build():
+        # Read the data
+        print('Load shapefile data from %s'%shapefile)
+        shp = gpd.read_file(shapefile)
+
+        # A couple of regions need to be merged as the counts data is presented for joint regions.
+        #  Bournemouth and Poole, Cornwall and Scilly, Hackney and City of London. See AREA_MERGES
+        shp3 = dissolve_areas(shp, 'ctyua17nm', AREA_MERGES)
+        print('NB Christchurch region is folded into Dorset')
+
+
+        # Set index to be the regional name
+        shp3 = shp3.set_index('ctyua17nm')
+
+        # Before plotting the data, first change the Coordinate Reference System to one that uses degrees, for plotting ease.
+        #  This is really slow
+        #imd = imd.to_crs("EPSG:3395") # metres
+        shp3 = shp3.to_crs("EPSG:4326") # degrees
+        #print(shp.crs)
+        return shp3
+
+    return cached_geodataframe('ctyua17_full_clipped', shapefile, build, AREA_MERGES)
+
+
+def build_geometry_cache():
+    """
+    Build (or refresh) the cached boundary geodataframes ahead of a batch run.
+    Shapefiles that are not present are skipped.
+    """
+    for loader in [load_shapefile, load_shapefile_old]:
+        try:
+            loader()
+        except IOError as e:
+            print('Skip %s: %s'%(loader.__name__, e))
+    return
+
+
+def load_geodataframe(days):
+    """
+    1. Load local authority boundary data in geopanda dataframe
+    2. Load covid-19 confirmed cases by day bdy local authority data
+    3. Add the confirmed cases data as new columns (per day) to the geopandas
+    dataframe.
+
+    Useage:
+    days = ['07', '08', '09', '10', '11', '12', '13']
+    geodf = load_geodataframe(days)
+    geodf.loc['Wirral']
+    """
+
+    # Load local authority boundary shapefile data in a geodataframe
+    if(0): #region['name'] == 'London': # use a shapefile that doesn't have the larger home counties in so that only Greater London (smaller regions) are plotted
+        print('Using old shapefile, smaller regions')
+        print('Hackney and City o L issue')
+        geodf = load_shapefile_old()
+    else:
+        geodf = load_shapefile()
+
+    # Load covid-19 confirmed cases by day bby local authority data
+    covid = load_covid()
+    #covid = load_tomwhite_covid()
+
+
+    # Add the count to the boundary shapefile, as a new column
+    print('Add COVID-19 data to geodataframe')
+    #print('Assume the column headers are dates of the form 07/03')
+    #for day in days:
+        #geodf[day] = covid[day+'/03']    print('Assume the column headers are dates of the form 07/03')
+    print('Assume the column headers are datetime entries')
+    with timed('join cases to geometry'):
+        for day in days:
+            geodf[day] = covid[day]
+
+    return geodf
+
+class RegionQuery:
+    """
+    Answer "which areas lie within this region's view" from a spatial index.
+    The bounding box of every area is computed once. A region's xlim/ylim box
+    is looked up in the geodataframe's sindex (STR tree) and the candidates
+    are kept if their bounding box lies inside the view, which for a
+    rectangular view is the same test as geodf.within(box). Answers are
+    memoised per view, so asking again for the same region is free.
+
+    Example usage:
+        query = region_query(geodf)
+        query.areas(region_Lon)     --> index of the areas in the London view
+        query.positions(region_Lon) --> their row numbers in geodf
+    """
+
+    def __init__(self, geodf):
+        self.geodf = geodf
+        self.bounds = geodf.geometry.bounds.to_numpy() # minx, miny, maxx, maxy
+        self.sindex = geodf.sindex
+        self._memo = {}
+
+    def positions(self, region):
+        """
+        Sorted row numbers of the areas within the region's xlim/ylim box
+        """
+        xmin,xmax = region['xlim']
+        ymin,ymax = region['ylim']
+        key = (xmin, xmax, ymin, ymax)
+        if key not in self._memo:
+            candidates = self.sindex.query(shapely.geometry.box(xmin, ymin, xmax, ymax))
+            bounds = self.bounds[candidates]
+            inside = (bounds[:,0] >= xmin) & (bounds[:,1] >= ymin) & (bounds[:,2] <= xmax) & (bounds[:,3] <= ymax)
+            self._memo[key] = np.sort(candidates[inside])
+        return self._memo[key]
+
+    def overlapping(self, region):
+        """
+        Sorted row numbers of the areas whose bounding box overlaps the
+        region's view, i.e. every area that can show in a map of the region
+        """
+        xmin,xmax = region['xlim']
+        ymin,ymax = region['ylim']
+        key = ('overlapping', xmin, xmax, ymin, ymax)
+        if key not in self._memo:
+            self._memo[key] = np.sort(self.sindex.query(shapely.geometry.box(xmin, ymin, xmax, ymax)))
+        return self._memo[key]
+
+    def mask(self, region):
+        """
+        Boolean array, True for rows of geodf within the region
+        """
+        mask = np.zeros(len(self.geodf), dtype=bool)
+        mask[self.positions(region)] = True
+        return mask
+
+    def areas(self, region):
+        return self.geodf.index[self.positions(region)]
+
+
+_region_queries = [] # RegionQuery for recently used geodataframes
+
+
+def region_query(geodf):
+    """
+    The RegionQuery for geodf, made on first use and then reused. The same
+    geodataframe object (e.g. the map geometry for a run) always gets the
+    same query, and so the same memoised answers.
+    """
+    for query in _region_queries:
+        if query.geodf is geodf:
+            return query
+    query = RegionQuery(geodf)
+    _region_queries.insert(0, query)
+    del _region_queries[8:] # only keep a few
+    return query
+
+
+def geometry_signature(geodf):
+    """
+    Short hash of a geodataframe's polygons: every coordinate (as WKB), in row
+    order, so any boundary edit changes it. Names files made from the
+    geometry, e.g. in LOD_DIR and LABEL_DIR. Hashing a large geometry takes a
+    while (0.3 s for 4M vertices): use geometry_lod(geodf).key, made once per
+    geodataframe.
+    """
+    sha = hashlib.sha1()
+    for wkb in shapely.to_wkb(geodf.geometry.values):
+        sha.update(b'\0' if wkb is None else wkb) # None (missing) still takes its place in the order
+    return sha.hexdigest()[:16]
+
+
+def label_grid(geodf, region, shape):
+    """
+    (height, width) int32 raster of the region's xlim/ylim view holding, for
+    each pixel centre, the row number in geodf of the area it falls in, or -1
+    for none. Row 0 is the top of the map (ylim[1]), as for
+    imshow(origin='upper'). Each area is only tested over its bounding box.
+    Made once per geometry, view and size, and kept in LABEL_DIR. The
+    geometry is identified by a hash of its coordinates (see
+    geometry_signature), so any boundary edit makes a new grid.
+
+    Example usage:
+        labels = label_grid(geodf, region_Lon, (693, 1155))
+        image = rgba_lut[labels] # one colour per area, last entry for -1
+    """
+    height, width = shape
+    xmin,xmax = region['xlim']
+    ymin,ymax = region['ylim']
+    view = hashlib.sha1(repr((float(xmin), float(xmax), float(ymin), float(ymax), int(height), int(width))).encode('utf-8'))
+    fname = os.path.join(LABEL_DIR, '%s_%s.npy'%(geometry_lod(geodf).key, view.hexdigest()[:12])) # hashed once per geodf
+    if os.path.exists(fname):
+        return np.load(fname)
+
+    with timed('label grid'):
+        x = xmin + (np.arange(width) + 0.5)*(xmax - xmin)/width
+        y = ymax - (np.arange(height) + 0.5)*(ymax - ymin)/height
+        labels = np.full((height, width), -1, dtype=np.int32)
+        geometry = geodf.geometry.values
+        bounds = geodf.geometry.bounds.to_numpy()
+        for row in region_query(geodf).overlapping(region):
+            if geometry[row] is None or geometry[row].is_empty:
+                continue
+            cols = np.flatnonzero( (x >= bounds[row,0]) & (x <= bounds[row,2]) )
+            rows = np.flatnonzero( (y >= bounds[row,1]) & (y <= bounds[row,3]) )
+            if len(rows) == 0 or len(cols) == 0:
+                continue
+            xx, yy = np.meshgrid(x[cols], y[rows])
+            inside = shapely.contains_xy(geometry[row], xx, yy)
+            labels[rows[0]:rows[-1]+1, cols[0]:cols[-1]+1][inside] = row
+
+    os.makedirs(LABEL_DIR, exist_ok=True)
+    part = '%s.%d.part'%(fname, os.getpid()) # one per process, so concurrent builds can't mix
+    with open(part, 'wb') as f:
+        np.save(f, labels)
+    os.replace(part, fname)
+    return labels
+
+
+def simplify_coverage(geometry, tolerance, is_coverage=True):
+    """
+    Simplify an array of polygons that tile the map (a coverage). Shared
+    edges are simplified once, so neighbouring areas still meet with no gaps
+    or overlaps. Needs shapely >= 2.1 and a valid coverage (no overlaps, see
+    shapely.coverage_is_valid), otherwise each polygon is simplified on its
+    own (topology preserving within the polygon). is_coverage=False skips
+    straight to that.
+    """
+    geometry = np.asarray(geometry)
+    if is_coverage and hasattr(shapely, 'coverage_simplify'):
+        return shapely.coverage_simplify(geometry, tolerance)
+    return shapely.simplify(geometry, tolerance, preserve_topology=True)
+
+
+class GeometryLOD:
+    """
+    Levels of detail for the boundaries of a geodataframe: the polygons
+    simplified at each of LOD_TOLERANCES. Each level is made once and stored
+    in LOD_DIR, keyed by the geometry and tolerance, so later runs load it.
+
+    The level for a map is the coarsest one whose tolerance is under half a
+    pixel at the output size, so the simplification can't be seen. A UK wide
+    view draws a fraction of the vertices while a London zoom keeps the full
+    boundaries.
+
+    Example usage:
+        lod = geometry_lod(geodf)
+        lod.tolerance_for(region_UK)         --> 0.004
+        uk_geodf = lod.for_view(region_UK)   --> geodf with simplified polygons
+    """
+
+    def __init__(self, geodf, tolerances=None):
+        self.geodf = geodf
+        self.tolerances = sorted(tolerances or LOD_TOLERANCES)
+        self.key = geometry_signature(geodf)
+        self._levels = {}
+        self._is_coverage = None # checked once, when the first level is made
+
+    def tolerance_for(self, region, dpi=150, figsize=(10.0, 6.0), axes_fraction=0.77):
+        """
+        Tolerance (degrees) of the coarsest level under half a pixel for a map
+        of the region's xlim/ylim at figsize and dpi. 0. for full detail.
+        """
+        width, height = figsize[0]*dpi*axes_fraction, figsize[1]*dpi*axes_fraction
+        pixel = max( np.diff(region['xlim'])[0]/width, np.diff(region['ylim'])[0]/height )
+        fine_enough = [tolerance for tolerance in self.tolerances if tolerance <= 0.5*pixel]
+        return fine_enough[-1] if fine_enough else 0.
+
+    def geometry(self, tolerance):
+        """
+        GeoSeries of the polygons simplified to tolerance, indexed as geodf
+        """
+        if not tolerance:
+            return self.geodf.geometry
+        if tolerance not in self._levels:
+            fname = os.path.join(LOD_DIR, '%s_%g.pkl'%(self.key, tolerance))
+            if os.path.exists(fname):
+                simplified = pd.read_pickle(fname)
+            else:
+                if self._is_coverage is None and hasattr(shapely, 'coverage_is_valid'):
+                    self._is_coverage = bool(shapely.coverage_is_valid(self.geodf.geometry.values))
+                    if not self._is_coverage:
+                        print('Boundaries overlap, simplifying each polygon on its own')
+                with timed('simplify geometry'):
+                    simplified = gpd.GeoSeries(simplify_coverage(self.geodf.geometry.values, tolerance,
+                                                                    is_coverage=self._is_coverage is not False),
+                                                index=self.geodf.index, crs=self.geodf.crs)
+                print('Simplified %d to %d vertices (tolerance %g)'%(shapely.get_num_coordinates(self.geodf.geometry.values).sum(),
+                                                        shapely.get_num_coordinates(simplified.values).sum(), tolerance))
+                os.makedirs(LOD_DIR, exist_ok=True)
+                part = '%s.%d.part'%(fname, os.getpid()) # one per process, so concurrent builds can't mix
+                simplified.to_pickle(part)
+                os.replace(part, fname)
+            self._levels[tolerance] = simplified
+        return self._levels[tolerance]
+
+    def build(self, regions, dpi=150):
+        """
+        Make (or load) the levels needed for the regions at dpi. Call before
+        starting a pool of frame workers so they load the levels rather than
+        each making them.
+        """
+        for region in regions:
+            self.geometry(self.tolerance_for(region, dpi))
+        return
+
+    def for_view(self, region, dpi=150, gdf=None):
+        """
+        gdf (default geodf, or any frame with rows of geodf, e.g. one day's
+        subset) with its polygons swapped for the level of detail to draw the
+        region at dpi
+        """
+        if gdf is None:
+            gdf = self.geodf
+        tolerance = self.tolerance_for(region, dpi)
+        if not tolerance:
+            return gdf
+        return gdf.set_geometry( self.geometry(tolerance).loc[gdf.index].values )
+
+
+_geometry_lods = [] # GeometryLOD for recently used geodataframes
+
+
+def geometry_lod(geodf):
+    """
+    The GeometryLOD for geodf, made on first use and then reused (see region_query)
+    """
+    for lod in _geometry_lods:
+        if lod.geodf is geodf:
+            return lod
+    lod = GeometryLOD(geodf)
+    _geometry_lods.insert(0, lod)
+    del _geometry_lods[8:] # only keep a few
+    return lod
+
+
+@timed('find_max_in_region')
+def find_max_in_region(geodf,region,days):
+    """
+    Find the largest cases value within a specified region and days list
+    days = ['07', '08', '09', '10', '11', '12', '13']
+    region_Lon = {'name': 'London',  'xlim':[-0.6,0.5], 'ylim':[51.2,51.8], 'date_loc':[0.2,51.75] }
+    maxval = find_max_in_region(geodf,region_Lon,days)
+    The areas within the region come from the spatial index (see RegionQuery)
+    """
+    positions = region_query(geodf).positions(region)
+    region_geodf = geodf.iloc[positions]
+
+    max_over_time_per_polygon = region_geodf[days].max(axis=1)
+
+    return max_over_time_per_polygon.max() # Max over time and region
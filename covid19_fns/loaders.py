@@ -0,0 +1,586 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Case data: cached downloads, binary snapshots and the CSV loaders that pivot
+the sources into (area x day) tables. Needs numpy and pandas only.
+"""
+
+import os
+import json
+import time
+import hashlib
+import shutil
+import urllib.request # fetch CSV data into a local cache
+import urllib.error
+import numpy as np
+import pandas as pd # read in CSV data
+
+from .settings import AREA_MERGES, CACHE_DIR, CACHE_TTL, OFFLINE, SNAPSHOT_DIR
+from .timing import count, timed
+
+## FUNCTIONS
+############################################################################
+
+def _cache_paths(url):
+    """
+    Data and metadata filenames in CACHE_DIR for a url
+    """
+    key = hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]
+    base = os.path.join(CACHE_DIR, key+'_'+os.path.basename(url.split('?')[0]))
+    return base, base+'.json'
+
+
+def seed_cache(url, fname):
+    """
+    Install a local file as the cached copy of url. Use to run against fixture
+    files with no network, e.g.
+        seed_cache(url, 'fixtures/covid-19-cases-uk.csv')
+        covid = load_tomwhite_covid() # with COVID19_OFFLINE=1
+    """
+    path, meta_path = _cache_paths(url)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    shutil.copyfile(fname, path)
+    with open(meta_path, 'w') as f:
+        json.dump({'url': url, 'etag': None, 'last_modified': None, 'fetched': time.time()}, f)
+    return path
+
+
+@timed('cached_csv')
+def cached_csv(url, ttl=None, offline=None):
+    """
+    Return a local filename holding the contents of url, downloading only
+    when needed. Copies are kept in CACHE_DIR, keyed by url.
+
+    A copy younger than ttl seconds (default CACHE_TTL) is used as is. Older
+    copies are re-validated with the server's ETag / Last-Modified headers, so
+    an unchanged file is not downloaded again. In offline mode (or
+    COVID19_OFFLINE=1) the cached copy is always used. If the download fails
+    a stale copy is used with a warning.
+    Local filenames are returned unchanged.
+
+    Example usage:
+        covid = pd.read_csv(cached_csv(url))
+    """
+    if not url.startswith(('http://', 'https://')):
+        return url
+    if ttl is None:
+        ttl = CACHE_TTL
+    if offline is None:
+        offline = OFFLINE
+
+    path, meta_path = _cache_paths(url)
+    meta = {}
+    if os.path.exists(path) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+
+    if offline:
+        if not meta:
+            raise IOError('No cached copy of %s in %s (offline mode)'%(url, CACHE_DIR))
+        return path
+    if meta and time.time() - meta['fetched'] < ttl:
+        return path
+
+    request = urllib.request.Request(url)
+    if meta.get('etag'):
+        request.add_header('If-None-Match', meta['etag'])
+    if meta.get('last_modified'):
+        request.add_header('If-Modified-Since', meta['last_modified'])
+
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            print('Download %s'%url)
+            count('csv downloads')
+            with open(path+'.part', 'wb') as f:
+                shutil.copyfileobj(response, f)
+            os.replace(path+'.part', path)
+            meta = {'url': url,
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified')}
+    except urllib.error.HTTPError as e:
+        if e.code != 304 or not meta: # 304: Not Modified, keep the cached copy
+            raise
+    except urllib.error.URLError as e:
+        if not meta:
+            raise
+        print('Could not fetch %s (%s). Using cached copy'%(url, e.reason))
+        return path
+
+    meta['fetched'] = time.time()
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+    return path
+
+
+def _source_signature(fname):
+    """
+    Identify the state of a source file by its path, size and modification time
+    """
+    st = os.stat(fname)
+    return {'source': os.path.abspath(fname), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def save_table_snapshot(table, name, source):
+    """
+    Save a 2D table of counts (e.g. Date x AreaCode) as a columnar snapshot in
+    SNAPSHOT_DIR/name: int32 values stored column by column, a mask of missing
+    values, and the row and column labels, each as a .npy file. The source
+    file's signature and table.attrs are kept in meta.json.
+    """
+    path = os.path.join(SNAPSHOT_DIR, name)
+    os.makedirs(path, exist_ok=True)
+
+    values = table.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    mask = np.isnan(values)
+    counts = np.asfortranarray( np.where(mask, 0, values).astype(np.int32) )
+
+    def labels(index):
+        if isinstance(index, pd.DatetimeIndex):
+            return index.values.astype('datetime64[ns]')
+        return np.asarray(index).astype(str)
+
+    np.save(os.path.join(path, 'values.npy'), counts)
+    np.save(os.path.join(path, 'mask.npy'), np.asfortranarray(mask))
+    np.save(os.path.join(path, 'index.npy'), labels(table.index))
+    np.save(os.path.join(path, 'columns.npy'), labels(table.columns))
+
+    meta = _source_signature(source)
+    meta['index_name'] = table.index.name
+    meta['columns_name'] = table.columns.name
+    meta['has_missing'] = bool(mask.any())
+    meta['attrs'] = table.attrs
+    # meta.json is written last: a snapshot without it is never used
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    return
+
+
+def _int32_table(counts, missing, index, columns):
+    """
+    DataFrame from an int32 count matrix and a matching matrix of missing
+    entries. Plain int32 columns if nothing is missing, otherwise nullable
+    Int32 columns (pd.NA for missing). Column major inputs are used without
+    copying.
+    """
+    if not missing.any():
+        return pd.DataFrame(counts, index=index, columns=columns, copy=False)
+    table = pd.DataFrame({j: pd.arrays.IntegerArray(counts[:, j], missing[:, j])
+                            for j in range(counts.shape[1])}, index=index, copy=False)
+    table.columns = columns
+    return table
+
+
+def load_table_snapshot(name, source):
+    """
+    Memory map the snapshot SNAPSHOT_DIR/name into a DataFrame. Returns None if
+    there is no snapshot or the source file has changed since it was made.
+    Tables with no missing values come back as int32, otherwise as nullable
+    Int32 columns. The arrays are copy-on-write, so the table can be edited.
+    """
+    path = os.path.join(SNAPSHOT_DIR, name)
+    try:
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+    except (IOError, ValueError):
+        return None
+    signature = _source_signature(source)
+    if any(meta.get(key) != signature[key] for key in signature):
+        return None
+
+    values = np.load(os.path.join(path, 'values.npy'), mmap_mode='c')
+    index = pd.Index(np.load(os.path.join(path, 'index.npy')), name=meta['index_name'])
+    columns = pd.Index(np.load(os.path.join(path, 'columns.npy')), name=meta['columns_name'])
+
+    if meta['has_missing']:
+        # Stored column major, so each column is a contiguous slice of the map
+        mask = np.load(os.path.join(path, 'mask.npy'), mmap_mode='c')
+    else:
+        mask = np.zeros(values.shape, dtype=bool)
+    table = _int32_table(values, mask, index, columns)
+    table.attrs.update(meta['attrs'])
+    return table
+
+
+def snapshot_table(name, source, build):
+    """
+    Load the table snapshot name if it is up to date with the source file,
+    otherwise build() it from source and save a new snapshot. Either way the
+    table comes back from the snapshot, so it has the same dtypes (int32 or
+    nullable Int32) and labels whether or not the cache was warm.
+
+    Example usage:
+        covid = snapshot_table('uk_summary', fname, lambda: parse_the_csv(fname))
+    """
+    table = load_table_snapshot(name, source)
+    if table is not None:
+        print('Load snapshot %s of %s'%(name, source))
+        count('snapshot hits')
+        return table
+    with timed('build snapshot %s'%name):
+        table = build()
+        save_table_snapshot(table, name, source)
+    snapshot = load_table_snapshot(name, source)
+    if snapshot is None: # the source changed while it was being read
+        return compact_counts(table)
+    return snapshot
+
+
+def area_merge_map(merges=AREA_MERGES):
+    """
+    {area name: merged area name} for every area in the merges table
+    """
+    return {part: merged for merged, parts in merges.items() for part in parts}
+
+
+@timed('merge areas')
+def merge_areas(table, merges=AREA_MERGES):
+    """
+    Rows of a table indexed by area name, with the areas in merges summed
+    into their merged area, in one groupby over the mapped names. An area
+    already reported under the merged name is summed in too. All missing
+    stays missing (NaN/NA), and the result is sorted by name.
+        covid = merge_areas(covid) # Area x Date
+    """
+    mapping = area_merge_map(merges)
+    names = pd.Index([mapping.get(name, name) for name in table.index], name=table.index.name)
+    return table.groupby(names, sort=True).sum(min_count=1)
+
+
+def read_dated_csv(fname, date_format="%Y-%m-%d", date_col='Date', **kwargs):
+    """
+    pd.read_csv() with the date column converted in one vectorised call to
+    pd.to_datetime with an explicit format, rather than a python date_parser
+    called once per row. Other keyword arguments go to pd.read_csv.
+
+    Example usage:
+        covid = read_dated_csv(fname, "%d/%m/%Y")
+    """
+    data = pd.read_csv(fname, **kwargs)
+    data[date_col] = pd.to_datetime(data[date_col], format=date_format)
+    return data
+
+
+class LongTablePivot:
+    """
+    Pivot a long table (one row per date and area) into a Date x AreaCode
+    matrix of int32 counts, a chunk of rows at a time. The count matrix and
+    a matrix of which entries were reported are preallocated and doubled in
+    size when a new date or area no longer fits, so the long table itself is
+    never held in memory. A repeated (date, area) row replaces the earlier one.
+
+    Example usage:
+        pivot = LongTablePivot()
+        for chunk in read_long_csv_chunks(fname):
+            pivot.add(chunk['Date'], chunk['AreaCode'], chunk['TotalCases'])
+        covid = pivot.table() --> Date x AreaCode, as DataFrame.pivot() would give
+    """
+
+    def __init__(self, nrows=128, ncols=512):
+        self.counts = np.zeros((nrows, ncols), dtype=np.int32)
+        self.present = np.zeros((nrows, ncols), dtype=bool)
+        self.rows = {} # date --> row
+        self.cols = {} # AreaCode --> column
+
+    @staticmethod
+    def _positions(lookup, labels):
+        """
+        Matrix positions of labels, adding new ones in order of appearance
+        """
+        labels = pd.Series(np.asarray(labels))
+        for label in labels.unique():
+            if label not in lookup:
+                lookup[label] = len(lookup)
+        return labels.map(lookup).to_numpy(dtype=np.intp)
+
+    def _grow(self):
+        nrows, ncols = self.counts.shape
+        while nrows < len(self.rows):
+            nrows = 2*nrows
+        while ncols < len(self.cols):
+            ncols = 2*ncols
+        if (nrows, ncols) != self.counts.shape:
+            counts = np.zeros((nrows, ncols), dtype=np.int32)
+            present = np.zeros((nrows, ncols), dtype=bool)
+            counts[:self.counts.shape[0], :self.counts.shape[1]] = self.counts
+            present[:self.counts.shape[0], :self.counts.shape[1]] = self.present
+            self.counts, self.present = counts, present
+        return
+
+    def add(self, dates, codes, values):
+        """
+        Add one chunk of rows. Values that are not numbers (e.g. '1 to 4')
+        are left missing, as DataFrame.pivot() then pd.to_numeric() would.
+        """
+        i = self._positions(self.rows, dates)
+        j = self._positions(self.cols, codes)
+        self._grow()
+        values = pd.to_numeric(pd.Series(np.asarray(values)), errors='coerce').to_numpy(dtype=float)
+        ok = ~np.isnan(values)
+        self.counts[i[ok], j[ok]] = values[ok]
+        self.present[i[ok], j[ok]] = True
+        self.present[i[~ok], j[~ok]] = False
+        return
+
+    def _order(self, lookup):
+        labels = np.array(list(lookup), dtype=object)
+        order = np.argsort(labels, kind='stable')
+        return labels[order], order
+
+    def table(self):
+        """
+        DataFrame of the counts so far, dates down and AreaCodes across, both
+        sorted. int32 if every entry was reported, otherwise nullable Int32.
+        """
+        dates, rows = self._order(self.rows)
+        codes, cols = self._order(self.cols)
+        counts = np.asfortranarray(self.counts[np.ix_(rows, cols)])
+        present = np.asfortranarray(self.present[np.ix_(rows, cols)])
+        return _int32_table(counts, ~present, pd.DatetimeIndex(dates, name='Date'),
+                            pd.Index(codes.astype(str), name='AreaCode'))
+
+    def day(self, date_time):
+        """
+        Series of one day's counts for the areas seen so far (nullable Int32)
+        """
+        codes, cols = self._order(self.cols)
+        row = self.rows[pd.Timestamp(date_time)]
+        return pd.Series(pd.arrays.IntegerArray(self.counts[row, cols].copy(), ~self.present[row, cols]),
+                            index=pd.Index(codes.astype(str), name='AreaCode'), name=pd.Timestamp(date_time))
+
+
+def compact_counts(table):
+    """
+    Case table with int32 counts: plain int32 columns if there are no gaps,
+    otherwise nullable Int32 (pd.NA for missing) rather than float64 with NaN.
+    Half the size of int64/float64 and the counts stay integers.
+        covid = compact_counts(covid)
+    """
+    values = table.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    missing = np.isnan(values)
+    if np.abs(values[~missing]).max(initial=0) > np.iinfo(np.int32).max:
+        raise ValueError('Counts too large for int32')
+    counts = np.asfortranarray( np.where(missing, 0, values).astype(np.int32) )
+    compact = _int32_table(counts, np.asfortranarray(missing), table.index, table.columns)
+    compact.attrs.update(table.attrs)
+    return compact
+
+
+def compact_areas(areas):
+    """
+    Lookup table of the areas (AreaCode, Country, Area), one row per area,
+    with every text column stored as a pandas category. Each country name is
+    then stored once and the rows hold small integer codes, and the
+    categories of AreaCode are a shared set of codes for any table that
+    refers to the areas.
+        lookup = compact_areas(areas)
+        lookup['Country'].cat.categories --> ['England', 'Northern Ireland', 'Scotland', 'Wales']
+    """
+    lookup = areas.drop_duplicates(areas.columns[0]).reset_index(drop=True)
+    for col in lookup.columns:
+        if pd.api.types.is_object_dtype(lookup[col]) or pd.api.types.is_string_dtype(lookup[col]):
+            lookup[col] = lookup[col].astype('category')
+    return lookup
+
+
+def memory_report(**tables):
+    """
+    Print and return the memory (MB) held by each table, counting the
+    strings in object columns and the index. DataFrames, Series, arrays and
+    dicts of them (e.g. derived series) can be given.
+        memory_report(raw=covid_raw, pivoted=covid, compact=compact_counts(covid))
+    """
+    def nbytes(thing):
+        if isinstance(thing, pd.DataFrame):
+            return int(thing.memory_usage(deep=True).sum())
+        if isinstance(thing, (pd.Series, pd.Index)):
+            return int(thing.memory_usage(deep=True))
+        if isinstance(thing, dict):
+            return sum(nbytes(value) for value in thing.values())
+        return np.asarray(thing).nbytes
+
+    report = pd.DataFrame({'MB': [nbytes(table)/1e6 for table in tables.values()]},
+                            index=pd.Index(list(tables), name='table'))
+    print('%-24s %10s'%('table', 'MB'))
+    for name, row in report.iterrows():
+        print('%-24s %10.3f'%(name, row['MB']))
+    return report
+
+
+def read_long_csv_chunks(fname, chunksize=50000, date_format="%Y-%m-%d", code_col='AreaCode'):
+    """
+    Read a long format CSV, e.g. tomwhite's covid-19-cases-uk.csv
+        Date	Country	AreaCode	Area	TotalCases
+        2020-03-05	England	E09000002	Barking and Dagenham	0
+    chunksize rows at a time, with the Date column parsed and rows with a
+    blank code_col dropped.
+    """
+    for chunk in pd.read_csv(fname, chunksize=chunksize, dtype={code_col: str}):
+        codes = chunk[code_col].str.strip()
+        chunk = chunk[codes.notna() & (codes != '')]
+        yield chunk.assign(Date=pd.to_datetime(chunk['Date'], format=date_format))
+
+
+@timed('pivot long csv')
+def pivot_long_csv(fname, value_col='TotalCases', code_col='AreaCode', keep=('Country', 'Area'), chunksize=50000):
+    """
+    Pivot a long format CSV to a Date x code_col table, streaming it through
+    a LongTablePivot so memory use is set by the size of the pivoted table,
+    not the CSV.
+
+    OUTPUT:
+        table - Date x AreaCode counts (see LongTablePivot.table)
+        areas - code_col plus the keep columns, first row for each code
+
+    Example usage:
+        covid, areas = pivot_long_csv(cached_csv(url))
+    """
+    pivot = LongTablePivot()
+    areas = []
+    seen = set()
+    for chunk in read_long_csv_chunks(fname, chunksize, code_col=code_col):
+        pivot.add(chunk['Date'], chunk[code_col], chunk[value_col])
+        first = chunk.drop_duplicates(code_col)
+        first = first[~first[code_col].isin(seen)]
+        seen.update(first[code_col])
+        areas.append(first[[code_col]+list(keep)])
+    areas = pd.concat(areas, ignore_index=True) if areas else pd.DataFrame(columns=[code_col]+list(keep))
+    return pivot.table(), areas
+
+
+def long_csv_days(fname, value_col='TotalCases', code_col='AreaCode', chunksize=50000):
+    """
+    Generator of per-day snapshots from a long format CSV sorted by date (as
+    tomwhite's is). Each day is yielded, as (date_time, Series of counts by
+    code), once the reader has moved past it, so consumers can start work
+    before the whole file is read. Areas not yet seen are not in the Series.
+
+    Example usage, drawing frames as the data arrives:
+        for date_time, counts in long_csv_days(fname):
+            values = counts.reindex(tc.geodf['ONScode']).to_numpy(dtype=float, na_value=np.nan)
+            engine.plot_frame(date_time, values=values)
+    """
+    pivot = LongTablePivot()
+    done = set()
+    pending = []
+    for chunk in read_long_csv_chunks(fname, chunksize, code_col=code_col):
+        if done and chunk['Date'].min() <= max(done):
+            raise ValueError('%s is not sorted by date. Use pivot_long_csv() instead'%fname)
+        pivot.add(chunk['Date'], chunk[code_col], chunk[value_col])
+        newest = chunk['Date'].max()
+        pending = sorted(set(pending) | set(chunk['Date'].unique()))
+        for date_time in [d for d in pending if d < newest]:
+            yield date_time, pivot.day(date_time)
+            done.add(date_time)
+        pending = [d for d in pending if d not in done]
+    for date_time in pending:
+        yield date_time, pivot.day(date_time)
+
+
+@timed('load_covid')
+def load_covid():
+    """
+    load in CSV data for confirmed cases per day and region
+
+    load in the field data with a column of place names and columns for values, each day.
+    Set the place names to the be index so they can be easily added as a new column to the boundary shapefile
+    """
+    # When I used the confirmed cases file that I managed:
+    #covid = pd.read_csv(dir+'Covid-19/Merged-Table.csv').set_index('GSS_NM')
+
+    # Source Google docs: https://docs.google.com/spreadsheets/d/129bJR5Mgcr5qOQNc96CBWKFfjODToWKRiVKDEg5ybkU/edit#gid=1952384968
+    # I export as CSV and manually trim unwanted fields at the bottom. I also don't use the first date column with non-integer values
+    # Region names header is empty --> "Unnamed: 0" to set this as the data index
+    fname = 'DATA/Covid-19/COVID19-UK - Summary.csv'
+    #fname = 'DATA/Covid-19/COVID19-England - Summary.csv'
+
+    def build():
+        print('Load COVID-19 data from %s'%fname)
+        covid = pd.read_csv(fname).set_index('Unnamed: 0')
+        # Relabel colums as datetime objects, all in one go: 'dd/mm' --> 2020-mm-dd
+        covid.columns = pd.to_datetime("2020/"+covid.columns, format="%Y/%d/%m")
+        return covid
+
+    covid = snapshot_table('uk_summary', fname, build)
+
+    return covid
+
+
+@timed('load_tomwhite_covid')
+def load_tomwhite_covid():
+    """
+    load in CSV data for confirmed cases per day and region.
+    load data from TomWhite GitHub:
+
+
+    Date	Country	AreaCode	Area	TotalCases
+    2020-03-05	England	E09000002	Barking and Dagenham	0
+
+    Pivot the data to rows of placenames and columns of dates
+    """
+
+    url = 'https://raw.githubusercontent.com/tomwhite/covid-19-uk-data/master/data/covid-19-cases-uk.csv'
+    print('Load COVID-19 data from %s'%url)
+    fname = cached_csv(url)
+
+    def build():
+        covid = read_dated_csv(fname, "%Y-%m-%d", index_col=3)
+        covid = covid.reset_index()
+        return covid.pivot(index='Area', columns='Date', values='TotalCases' )
+
+    covid = snapshot_table('tomwhite_cases_by_area', fname, build)
+    covid = covid.drop('awaiting clarification').drop('Awaiting confirmation')
+    try:
+        covid = covid.drop('Resident outside Wales').drop('Residential area to be confirmed')
+    except:
+        pass
+    # Drop first two date columns with incomplete data
+    covid.drop(covid.columns[[0, 1]], axis=1, inplace=True)
+    # Patch a data
+    """
+    ## Find rows where NaNs are lurking
+    is_NaN = covid.isnull()
+    row_has_NaN = is_NaN.any(axis=1); rows_with_NaN = covid[row_has_NaN]
+    rows_with_NaN
+    """
+
+    # Early days were reported for Cornwall, Poole, Hackney etc before the joint
+    #  areas were used. Sum them into the joint areas, to match the shapefile.
+    covid = merge_areas(covid)
+
+    ## Remove Scotland for Now
+    """
+    rows_with_NaN
+
+    Date                             2020-03-07 2020-03-08 2020-03-09 2020-03-10  ... 2020-03-13 2020-03-14 2020-03-15 2020-03-16
+    Area                                                                          ...
+    Borders                                 NaN        NaN        NaN        NaN  ...          3          5          7          7
+    Dumfries and Galloway                   NaN        NaN        NaN        NaN  ...        NaN        NaN        NaN          1
+    Highland                                NaN        NaN        NaN        NaN  ...        NaN          1          2          2
+    Shetland                                NaN        NaN          2          2  ...          6         11         11         15
+    """
+    covid = compact_counts( covid.dropna() ) # nasty nan's stopped the data being interpreted as int on reading in.
+    return covid
+
+
+@timed('load_tomwhite_uktotals')
+def load_tomwhite_uktotals():
+    """
+    load in CSV data for UK deaths.
+    load data from TomWhite GitHub:
+
+    Date	Tests	ConfirmedCases	Deaths
+    2020-01-25	31	0	0
+
+    totals = load_tomwhite_uktotals()
+    Pivot the data to rows of placenames and columns of dates
+    """
+
+    url = 'https://raw.githubusercontent.com/tomwhite/covid-19-uk-data/master/data/covid-19-totals-uk.csv'
+    print('Load COVID-19 data from %s'%url)
+
+    totals = read_dated_csv(cached_csv(url), "%Y-%m-%d", index_col=3)
+    totals = totals.reset_index()
+    #totals = totals.pivot(index='Area', columns='Date', values='TotalCases' )
+
+    return totals
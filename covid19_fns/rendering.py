@@ -0,0 +1,1226 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Maps, charts and animations: colour scales, single frames, the reusable
+FrameEngine, frame caching and parallel/streamed output. Needs matplotlib.
+The geometry module (geopandas) is only imported by the map functions, so
+the charts of the UK totals do not need it.
+"""
+
+import matplotlib # colormap registry
+import matplotlib.pyplot as plt # plotting
+import matplotlib.cm as cm   # colormap functionality
+import matplotlib.colors as mcolors # make new colormap
+from matplotlib.dates import DateFormatter # format x-axis dates
+import os
+import io
+import json
+import hashlib
+import shutil
+import subprocess # stream animation frames to ffmpeg
+import datetime
+import multiprocessing # render frames in parallel
+import numpy as np
+from PIL import Image, GifImagePlugin # write gifs frame by frame, without ffmpeg
+
+from . import settings # settings.FIGURES_DIR is read when a figure is saved, so a batch job can set it
+from .settings import FRAME_CUBE_DIR, RENDER_MANIFEST
+from .timing import count, timed
+from .loaders import load_tomwhite_uktotals
+from .analytics import doubling, timeseries_matrix
+
+#%matplotlib inline
+#get_ipython().run_line_magic('matplotlib', 'qt')
+
+## FUNCTIONS
+############################################################################
+
+def plot_panel(ax,daystr):
+    """
+    Basic panel plotting as geopandas does not do subplot nicely. Might be good
+    for a N plus delta-N plot...
+
+    Example usage:
+        fig, (ax1, ax2, ax3) = plt.subplots(ncols=3, sharex=True, sharey=True)
+        plot_panel(ax1,'10')
+        plot_panel(ax2,'11')
+        plot_panel(ax3,'12')
+    """
+    if ax==ax3:
+        bool_val = True
+    else:
+        bool_val = False
+    shp.boundary.plot( ax=ax, linewidth=0.5 )
+    shp.plot(column=daystr, ax=ax, legend=bool_val, missing_kwds={'color': 'lightgray'},
+                 vmin=0, vmax=11 ,cmap=make_colormap() )
+    ax.set_xlim([-4,0])
+    ax.set_ylim([52,55])
+    ax.set_xlabel('longitude (deg)')
+    ax.set_ylabel('latitude (deg)')
+    ax.set_title(daystr + "March")
+
+    return
+
+
+def make_colormap(type='lin', N=11):
+    """
+    make a suitable colorbar
+    If linear
+        white = 0, 5 darkening blue then 5 darkening red. Then set_over=black.
+        11 color blocks + one over block
+    If log
+
+    Useage:
+    my_cmap = make_colormap() # returns a linear colormap for 11 colours
+    """
+    # ##
+
+    # Make a new colormap by adding white to the end of an exisiting colormap
+    if(0): # colormap from tab10
+        tmp_cmap = matplotlib.colormaps['tab10']
+        colors_orig = tmp_cmap(np.linspace(0, 1, 10))
+
+        # swap some colors around
+        colors_orig[[0, 7],:] = colors_orig[[7, 0],:]
+        colors_orig[0,:] = [0.9 , 0.9, 1. , 1.]
+
+        white_pal = np.array([[1., 1., 1., 1.]]) # For zero values on the end of colormap
+        #grey_pal = np.array([[.8, .8, .8, 1.]])
+
+        #print(colors_orig)
+        #print(white_pal)
+
+        ## stack colors together
+        colors_new = np.vstack(( white_pal, colors_orig ))  # from tab10
+
+        # create new colormap
+        my_cmap = mcolors.ListedColormap( colors_new )
+
+    if type == 'lin':
+        # Make a new colormap by adding colours together
+        blu_cmap=matplotlib.colormaps['Blues'].resampled(6)
+        red_cmap=matplotlib.colormaps['Reds'].resampled(6)
+
+        white_pal = np.array([[1., 1., 1., 1.]])
+        #grey_pal = np.array([[.8, .8, .8, 1.]])
+
+        ## stack colors together: White, Blue and Red
+        colors_new = np.vstack(( white_pal, blu_cmap(np.linspace(0.25, 1, 5)), red_cmap(np.linspace(0.25, 1, 5)) ))
+
+        # create new colormap
+        my_cmap = mcolors.ListedColormap( colors_new )
+
+        my_cmap.set_over('black')
+        #my_cmap.set_under('white')
+    elif type == 'log':
+        # Make a new colormap by adding colours together
+        blu_cmap=matplotlib.colormaps['Blues'].resampled((N+1) // 2)
+        red_cmap=matplotlib.colormaps['Reds'].resampled((N+1) // 2)
+
+        white_pal = np.array([[1., 1., 1., 1.]])
+        #grey_pal = np.array([[.8, .8, .8, 1.]])
+
+        ## stack colors together: Blue and Red
+        #colors_new = np.vstack(( blu_cmap(np.linspace(0.25, 0.75, 5)), red_cmap(np.linspace(0.25, 1, 5)) ))
+        colors_new = np.vstack(( white_pal, blu_cmap(np.linspace(0.25, 0.75, 5)), red_cmap(np.linspace(0.25, 1, 5)) ))
+
+        # create new colormap
+        my_cmap = mcolors.ListedColormap( colors_new )
+
+        my_cmap.set_over('black')
+        my_cmap.set_under('white')
+
+    return my_cmap
+
+
+def frame_filename(region, date_time, datefmt="%d"):
+    """
+    PNG filename in FIGURES_DIR for a region's map frame on a day
+        frame_filename(region_Lon, datetime.datetime(2020,3,13)) --> FIGURES/COVID-19_London_13.png
+    """
+    return os.path.join(settings.FIGURES_DIR, 'COVID-19_'+region['name']+'_'+date_time.strftime(datefmt)+'.png')
+
+
+def region_title(region):
+    """
+    Title and colorbar orientation for a region's map frames
+    titlestr, orientation_str = region_title(region_NW)
+    """
+    if region['name'] == 'London':
+        orientation_str='horizontal'
+        titlestr = 'COVID-19 total confirmed cases for LONDON by local authority'
+    elif region['name'] == 'NW':
+        #titlestr = 'COVID-19 total confirmed cases for NW England and Wales by local authority'
+        titlestr = 'COVID-19 total confirmed cases for NW England by local authority'
+        orientation_str='vertical'
+    else:
+        #titlestr = 'COVID-19 total confirmed cases for England and Wales by local authority'
+        titlestr = 'COVID-19 total confirmed cases for England by local authority'
+        orientation_str='vertical'
+    return titlestr, orientation_str
+
+
+def log_ticks(maxval, N=13):
+    """
+    Integer colorbar ticks (and boundaries) for a log colour scale of N blocks
+    ticks = log_ticks(250, N=13) --> [1, 2, 3, 4, 5, 8, ... ]
+    """
+    # Find base such that int(base**(N-1) = maxval
+    base = np.e**(np.log(maxval) /(N))
+    ticks = [int(base**i) for i in range(N+2) ]
+    ticks = list(set(ticks))
+    ticks.sort()
+    ticks = ticks[0:N+1]
+    return ticks
+
+
+class ColourScale:
+    """
+    Log colour scale for map frames, for a given maxval and number of
+    colorbar elements N. Holds the ListedColormap, the LogNorm, the colorbar
+    ticks/boundaries and a table of RGBA colours. Values are quantised once
+    into bin numbers (rows of rgba_table), after which colouring a frame is a
+    single array lookup. Use colour_scale() to get a shared, cached instance.
+
+    Example usage:
+        scale = colour_scale(maxval=250., N=13)
+        bins = scale.bins(time_series)      # every area and day at once
+        rgba = scale.rgba_table[bins[:, i]] # colours for day i
+    Bins match cmap(norm(values)): values <= 0 take the colormap's 'bad'
+    colour (as LogNorm masks them) and NaN is MISSING (light grey).
+    """
+
+    def __init__(self, maxval, N=13, make_cmap=None):
+        if make_cmap is None:
+            make_cmap = make_colormap
+        self.maxval = maxval
+        self.N = N
+        self.cmap = make_cmap(type='log', N=N)
+        self.norm = mcolors.LogNorm(vmin=1, vmax=maxval)
+        self.ticks = log_ticks(maxval, N)
+
+        ncolors = self.cmap.N
+        self.UNDER, self.OVER, self.BAD, self.MISSING = ncolors, ncolors+1, ncolors+2, ncolors+3
+        self.rgba_table = np.vstack(( self.cmap(np.arange(ncolors)),
+                                    [self.cmap.get_under(), self.cmap.get_over(), self.cmap.get_bad(),
+                                     mcolors.to_rgba('lightgray')] ))
+
+    def bins(self, values):
+        """
+        Row of rgba_table for each value, for an array of any shape
+        """
+        values = np.asarray(values, dtype=float)
+        ncolors = self.cmap.N
+        normed = self.norm(np.ma.masked_invalid(values))
+        xa = np.ma.getdata(normed) * ncolors
+        xa[xa == ncolors] = ncolors - 1 # the top of the scale is in range
+        bad = np.ma.getmaskarray(normed) | np.isnan(xa)
+        xa = np.where(bad, 0., xa)
+        bins = np.clip(np.floor(xa), 0, ncolors-1).astype(np.uint8)
+        bins[xa < 0] = self.UNDER
+        bins[xa >= ncolors] = self.OVER
+        bins[bad] = self.BAD
+        bins[np.isnan(values)] = self.MISSING
+        return bins
+
+    def rgba(self, values):
+        """
+        RGBA colours for an array of values
+        """
+        return self.rgba_table[self.bins(values)]
+
+
+_colour_scales = {} # (maxval, N, make_cmap): ColourScale
+
+
+def colour_scale(maxval, N=13, make_cmap=None):
+    """
+    The ColourScale for (maxval, N, make_cmap), made once and then reused.
+    The scale does not depend on the region, so all regions with the same
+    maxval share it.
+    """
+    key = (float(maxval), N, make_cmap)
+    if key not in _colour_scales:
+        _colour_scales[key] = ColourScale(maxval, N, make_cmap)
+    return _colour_scales[key]
+
+
+@timed('single_frame_plot')
+def single_frame_plot(geodf,date_time,region,maxval=20.,writer=None,lod=False,fname_datefmt="%d"):
+    """
+    Draw and save a map frame for a given day and region.
+    Example usage:
+        region_Lon = {'name': 'London',  'xlim':[-0.6,0.5], 'ylim':[51.2,51.8], 'date_loc':[0.2,51.75] }
+        date_time = datetime.datetime(2020,3,5)
+        maxval = 10.
+        single_frame_plot(geodf,date_time,region_Lon,maxval)
+    --> FIGURES/COVID-19_London_13.png
+
+    With writer (e.g. an AnimationWriter) the frame is passed to
+    writer.add_figure() instead of being saved as a PNG. Returns None then.
+
+    lod=True draws the boundaries at the level of detail for the region's
+    extent (see GeometryLOD). By default the full boundaries are drawn.
+
+    fname_datefmt is the date format in the PNG filename, e.g. "%Y%m%d" for
+    days more than a month apart (see frame_filename).
+    """
+
+    #datestr = daystr + " March"
+    datestr = date_time.strftime("%a %d %b")  # datetime
+    daystr =  date_time.strftime("%d")
+
+    if lod:
+        from .geometry import geometry_lod
+        geodf = geometry_lod(geodf).for_view(region, dpi=150)
+
+    #sourcestr = 'data source: www.gov.uk/government/publications/coronavirus-covid-19-number-of-cases-in-england'
+    sourcePHEstr = 'data source: www.gov.uk/government/publications/covid-19-track-coronavirus-cases'
+    sourcePHWstr = 'phw.nhs.wales/news/public-health-wales-statement-on-novel-coronavirus-outbreak'
+    sourceGoogstr = 'compiled: www.lpchong.com/post/covid19-confirmed-cases-in-england-by-upper-tier-local-authority-daily'
+    sourceGITstr = 'code: github.com/jpolton/COVID-19'
+    # Set the font dictionaries (for plot title and axis titles)
+    kw_source_label = {'fontname':'Arial', 'size':'6', 'color':'black', 'weight':'normal',
+                'horizontalalignment': 'right', 'verticalalignment':'top'}
+    kw_sourcegit_label = {'fontname':'Arial', 'size':'6', 'color':'black', 'weight':'normal',
+                'horizontalalignment': 'left', 'verticalalignment':'top'}
+    kw_date_label = {'fontname':'Arial', 'size':'16', 'color':'black', 'weight':'bold',
+                'horizontalalignment': 'left', 'verticalalignment':'bottom'}
+
+    # Make a colormap with ticks and labels for the given max value. Using a logscale
+    #my_colormap, my_ticks, my_ticklabels = make_colormap2(maxval)
+
+    colormap_type = 'log' # 'lin' # 'log' WIP.
+    N = 13 # Number of rectangular colorbar elements
+
+    # One figure per frame: a dummy figure made first to set the size was never closed
+    fig, ax = plt.subplots(1, 1, figsize=(10.0, 6.0))
+    plt.rcParams['figure.figsize'] = (10.0, 6.0)
+
+    geodf.boundary.plot( ax=ax, linewidth=0.25, color='k' ) # make boundaries grey when there are more reported areas
+    if colormap_type == 'lin':
+        colorbar_extend_str = 'max'
+        geodf.plot(column=date_time, ax=ax, legend=False,
+                vmin=0, vmax=maxval,
+                missing_kwds={'color': 'lightgray'},
+                cmap=make_colormap() )
+    elif colormap_type == 'log':
+        colorbar_extend_str = 'min'
+        scale = colour_scale(maxval, N)
+        geodf.plot(column=date_time, ax=ax, legend=False,
+                missing_kwds={'color': 'lightgray'},
+                cmap=scale.cmap,
+                norm=scale.norm )
+
+
+
+    # Edit and present colorbar
+    axx=plt.gca()
+    titlestr, orientation_str = region_title(region)
+    #if region['name'] == 'London':
+    #    cb=plt.colorbar(axx.collections[1], extend=colorbar_extend_str, orientation='horizontal')
+    #    cb.ax.set_xlabel('Number of confirmed cases')
+    #else:
+    #    cb=plt.colorbar(axx.collections[1], extend=colorbar_extend_str, orientation='vertical')
+    #    cb.ax.set_ylabel('Number of confirmed cases')
+
+    if colormap_type == 'log':
+        ticks = scale.ticks
+
+        cb=plt.colorbar(axx.collections[1], extend='max',
+                                #norm=mcolors.LogNorm(vmin=0, vmax=maxval),
+                                ticks=ticks,
+                                boundaries=ticks,
+                                spacing='proportional',
+                                orientation=orientation_str)
+
+        #cb.set_ticks(ticks)
+        cb.set_ticklabels( [str(i) for i in ticks] )
+
+    ax.set_xlim(region['xlim'])
+    ax.set_ylim(region['ylim'])
+    #ax.set_xlim([-6,2])
+    #ax.set_ylim([50,56])
+
+    ax.set_title(titlestr)
+    ax.text(region['date_loc'][0], region['date_loc'][1], datestr, **kw_date_label)
+    #ax.text(region['xlim'][1], region['ylim'][0], sourcePHEstr, **kw_source_label )
+    ax.text(region['xlim'][1], region['ylim'][0], sourcePHEstr+'\n'+sourceGoogstr, **kw_source_label )
+    ax.text(region['xlim'][0], region['ylim'][0], sourceGITstr, **kw_sourcegit_label )
+
+    ax.axis('off')
+    #fig.tight_layout()
+    if writer is not None:
+        with timed('encode frame'):
+            writer.add_figure(fig)
+        count('frames drawn')
+        plt.close(fig)
+        return None
+
+    fname = frame_filename(region, date_time, fname_datefmt)
+    print('Saving %s'%fname)
+    with timed('savefig'):
+        plt.savefig(fname, dpi=150)
+    count('frames drawn')
+
+    return fname
+
+
+
+class FrameEngine:
+    """
+    Draw the static parts of a region's map frame once and re-colour the
+    polygons for each day. The figure, boundary layer, polygon collection,
+    colorbar, titles and source labels are made in __init__. plot_frame() only
+    sets the polygon face colours and the date label before saving.
+
+    Example usage:
+        region_Lon = {'name': 'London',  'xlim':[-0.6,0.5], 'ylim':[51.2,51.8], 'date_loc':[0.2,51.75] }
+        engine = FrameEngine(geodf, region_Lon, maxval=200.)
+        for date_time in days:
+            engine.plot_frame(date_time)
+        engine.close()
+    --> FIGURES/COVID-19_London_07.png, FIGURES/COVID-19_London_08.png, ...
+
+    geodf         - geodataframe with a column of values per day
+    boundary_geodf - geodataframe for the boundary layer (default: geodf)
+    make_cmap     - colormap function, as make_colormap (see ColourScale)
+    titlestr, sourcestr - override the England defaults
+    fname_datefmt - date format in the PNG filenames
+    lod           - draw boundaries simplified for the region's extent (see GeometryLOD).
+                    Off by default, so frames match the full boundaries exactly
+    raster        - draw the map as one image: each pixel's area comes from a
+                    label_grid() made once, so a frame is rgb_lut[pixels] and
+                    no polygons are filled or outlined. Boundaries are pixels
+                    where the boundary layer's labels change, drawn darkened.
+
+    Values can also be passed in directly, e.g. from a TimeChoropleth:
+        engine = FrameEngine(tc.geodf, region_Lon, maxval=200.)
+        engine.plot_frame(date_time, values=tc.values_on(date_time))
+    """
+
+    N = 13 # Number of rectangular colorbar elements
+
+    def __init__(self, geodf, region, maxval=20., boundary_geodf=None,
+                    make_cmap=None, titlestr=None, sourcestr=None, dpi=150, fname_datefmt="%d", lod=False,
+                    raster=False):
+
+        sourcePHEstr = 'data source: www.gov.uk/government/publications/covid-19-track-coronavirus-cases'
+        sourceGoogstr = 'compiled: www.lpchong.com/post/covid19-confirmed-cases-in-england-by-upper-tier-local-authority-daily'
+        sourceGITstr = 'code: github.com/jpolton/COVID-19'
+        # Set the font dictionaries (for plot title and axis titles)
+        kw_source_label = {'fontname':'Arial', 'size':'6', 'color':'black', 'weight':'normal',
+                    'horizontalalignment': 'right', 'verticalalignment':'top'}
+        kw_sourcegit_label = {'fontname':'Arial', 'size':'6', 'color':'black', 'weight':'normal',
+                    'horizontalalignment': 'left', 'verticalalignment':'top'}
+        kw_date_label = {'fontname':'Arial', 'size':'16', 'color':'black', 'weight':'bold',
+                    'horizontalalignment': 'left', 'verticalalignment':'bottom'}
+
+        if sourcestr is None:
+            sourcestr = sourcePHEstr+'\n'+sourceGoogstr
+        default_titlestr, orientation_str = region_title(region)
+        if titlestr is None:
+            titlestr = default_titlestr
+        if boundary_geodf is None:
+            boundary_geodf = geodf
+        from .geometry import geometry_lod, label_grid
+        full_geodf, full_boundary = geodf, boundary_geodf # label grids are made from the full boundaries
+        if lod: # boundaries simplified for the region's extent, see GeometryLOD
+            geodf = geometry_lod(geodf).for_view(region, dpi)
+            boundary_geodf = geometry_lod(boundary_geodf).for_view(region, dpi)
+
+        self.geodf = geodf
+        self.region = region
+        self.dpi = dpi
+        self.fname_datefmt = fname_datefmt
+        self.orientation = orientation_str
+        self.make_cmap = make_cmap
+
+        self.fig, ax = plt.subplots(1, 1, figsize=(10.0, 6.0))
+        self.ax = ax
+
+        self.raster = raster
+        if raster: # geographic aspect, as geopandas sets it when plotting
+            ymin, ymax = full_geodf.total_bounds[[1, 3]]
+            ax.set_aspect( 1/np.cos(np.deg2rad((ymin + ymax)/2)) )
+        else:
+            boundary_geodf.boundary.plot( ax=ax, linewidth=0.25, color='k' )
+
+        if not raster:
+            # One patch per polygon part. Remember which row of geodf each part
+            # belongs to so a day's values can be spread over the patches.
+            parts = geodf.geometry.reset_index(drop=True).explode(index_parts=False)
+            parts = parts[ ~(parts.isna() | parts.is_empty) ] # geopandas doesn't draw these
+            self.part_row = parts.index.values
+            parts.plot( ax=ax, color='lightgray' )
+            self.collection = ax.collections[-1]
+
+        self.cax = None
+        self.maxval = None
+        self.set_maxval(maxval)
+
+        ax.set_xlim(region['xlim'])
+        ax.set_ylim(region['ylim'])
+
+        if raster:
+            # One label per output pixel of the map axes (after the colorbar and aspect are set)
+            ax.apply_aspect()
+            box = ax.get_position()
+            width, height = self.fig.get_size_inches()*dpi
+            shape = ( int(round(box.height*height)), int(round(box.width*width)) )
+            labels = label_grid(full_geodf, region, shape)
+            outline = label_grid(full_boundary, region, shape)
+            edge = np.zeros(shape, dtype=bool)
+            edge[:, 1:] |= outline[:, 1:] != outline[:, :-1]
+            edge[1:, :] |= outline[1:, :] != outline[:-1, :]
+            # Index into the colour table of a frame: one colour per area, then
+            # the background (label -1), then the same again darkened for edges
+            nareas = len(full_geodf)
+            self.pixels = np.where(labels < 0, nareas, labels) + (nareas + 1)*edge
+            self.background = np.round(np.array(mcolors.to_rgb(self.fig.get_facecolor()))*255)
+            self.image = ax.imshow(np.zeros(shape+(3,), dtype=np.uint8), origin='upper', interpolation='nearest',
+                            extent=(region['xlim'][0], region['xlim'][1], region['ylim'][0], region['ylim'][1]),
+                            aspect=ax.get_aspect())
+
+        ax.set_title(titlestr)
+        self.date_text = ax.text(region['date_loc'][0], region['date_loc'][1], '', **kw_date_label)
+        ax.text(region['xlim'][1], region['ylim'][0], sourcestr, **kw_source_label )
+        ax.text(region['xlim'][0], region['ylim'][0], sourceGITstr, **kw_sourcegit_label )
+
+        ax.axis('off')
+
+    def set_maxval(self, maxval):
+        """
+        Set the top of the colour scale and redraw the colorbar. Only the
+        colorbar axes are redrawn, the map is left as it is.
+        """
+        if maxval == self.maxval:
+            return
+        self.maxval = maxval
+        self.scale = colour_scale(maxval, self.N, self.make_cmap)
+        ticks = self.scale.ticks
+        mappable = cm.ScalarMappable(norm=self.scale.norm, cmap=self.scale.cmap)
+        mappable.set_array([])
+        if self.cax is None:
+            cb = self.fig.colorbar(mappable, ax=self.ax, extend='max',
+                                    ticks=ticks,
+                                    boundaries=ticks,
+                                    spacing='proportional',
+                                    orientation=self.orientation)
+            self.cax = cb.ax
+        else:
+            self.cax.cla()
+            cb = self.fig.colorbar(mappable, cax=self.cax, extend='max',
+                                    ticks=ticks,
+                                    boundaries=ticks,
+                                    spacing='proportional',
+                                    orientation=self.orientation)
+        cb.set_ticklabels( [str(i) for i in ticks] )
+        return
+
+    def colour_frame(self, values=None, bins=None):
+        """
+        Set the polygon colours from an array of values, one per row of geodf,
+        or from their bins in self.scale (see ColourScale.bins).
+        NaN values are drawn light grey, as with missing_kwds in geodf.plot()
+        """
+        if bins is None:
+            bins = self.scale.bins(values)
+        if self.raster:
+            rgb = np.vstack([ self.scale.rgba_table[bins][:, :3]*255, self.background ])
+            rgb_lut = np.vstack([ rgb, 0.5*rgb ]).round().astype(np.uint8) # 0.5: thin black boundary lines
+            self.image.set_data( rgb_lut[self.pixels] )
+            return
+        self.collection.set_facecolor( self.scale.rgba_table[ bins[self.part_row] ] )
+        return
+
+    @timed('FrameEngine.plot_frame')
+    def plot_frame(self, date_time, values=None, writer=None, bins=None):
+        """
+        Colour and save the frame for date_time. By default the values come
+        from the geodf column for that day. Pass bins (from self.scale) to
+        skip the quantising. Returns the PNG filename, or None if the frame
+        was passed to writer.add_figure() instead.
+        """
+        if bins is None and values is None:
+            values = self.geodf[date_time].values
+        self.colour_frame(values, bins)
+        self.date_text.set_text( date_time.strftime("%a %d %b") )
+
+        if writer is not None:
+            with timed('encode frame'):
+                writer.add_figure(self.fig)
+            count('frames drawn')
+            return None
+
+        fname = frame_filename(self.region, date_time, self.fname_datefmt)
+        print('Saving %s'%fname)
+        with timed('savefig'):
+            self.fig.savefig(fname, dpi=self.dpi)
+        count('frames drawn')
+        return fname
+
+    def close(self):
+        plt.close(self.fig)
+        return
+
+
+def widgets_thing():
+    """
+    Aim to use widgets to control view date. Not tested.
+    """
+    import ipywidgets as widgets
+
+    start_date_str = '07'
+    end_date_str = '11'
+
+    start_date = int(start_date_str)
+    end_date = int(end_date_str)
+
+    # Vary the day with a slider
+    selection_date_slider = widgets.IntSlider(
+        min=start_date,max=end_date,value=end_date-start_date+1,
+        continuous_update=False,
+        description='date',
+        orientation='horizontal',
+        layout={'width': '600px'}
+    )
+
+    widgets.interact(
+        single_frame_plot,
+        daystr=str(selection_date_slider)
+    );
+
+
+def figure_to_rgb(fig, dpi=150):
+    """
+    Render a figure to a (height, width, 3) uint8 array, as savefig would at dpi
+    """
+    buf = io.BytesIO()
+    fig.savefig(buf, format='rgba', dpi=dpi)
+    width = int(fig.get_figwidth()*dpi)
+    rgba = np.frombuffer(buf.getbuffer(), dtype=np.uint8).reshape(-1, width, 4)
+    return rgba[:, :, :3]
+
+
+def find_encoder(output):
+    """
+    Path of the ffmpeg to encode output with, or None if there is no ffmpeg and
+    output is a .gif, which AnimationWriter then writes with Pillow. Raises
+    RuntimeError if output needs ffmpeg and there is none.
+    """
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None and not output.lower().endswith('.gif'):
+        raise RuntimeError('Writing %s needs ffmpeg, which is not on the PATH. '
+                            'Install ffmpeg, or write a .gif (needs only Pillow)'%output)
+    return ffmpeg
+
+
+class AnimationWriter:
+    """
+    Stream frames into an animated .gif or .mp4 as they are rendered, with no
+    intermediate PNG files. Each frame is encoded as soon as it arrives, so
+    only one frame is held in memory at a time. Frames are piped to ffmpeg if
+    it is on the PATH. Otherwise gifs are written in this process with Pillow
+    (a palette per frame); .mp4 needs ffmpeg and raises RuntimeError at once.
+
+    Example usage:
+        with AnimationWriter('FIGURES/COVID-19_London.gif', delay=100) as writer:
+            for date_time in days:
+                single_frame_plot(geodf,date_time,region_Lon,maxval,writer=writer)
+
+    delay - time between frames in 1/100 s (as for convert -delay)
+    repeat - loop the .gif forever
+    """
+
+    def __init__(self, output, delay=100, dpi=150, repeat=True):
+        self.output = output
+        self.delay = delay
+        self.dpi = dpi
+        self.repeat = repeat
+        self.size = None
+        self.nframes = 0
+        self._proc = None
+        self._gif = None
+        self.ffmpeg = find_encoder(output)
+
+    def _open(self, width, height):
+        self.size = (width, height)
+        print('Writing %s'%self.output)
+        if self.ffmpeg is None:
+            self._gif = open(self.output, 'wb')
+            return
+        cmd = [self.ffmpeg, '-y', '-loglevel', 'error',
+                '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', '%dx%d'%(width,height),
+                '-framerate', '%g'%(100./self.delay), '-i', '-']
+        if self.output.lower().endswith('.gif'):
+            # A palette per frame, so ffmpeg does not need to buffer the whole animation
+            cmd += ['-vf', 'split[a][b];[a]palettegen=stats_mode=single[p];[b][p]paletteuse=new=1',
+                    '-loop', '0' if self.repeat else '-1']
+        else:
+            # h264 needs even image dimensions
+            cmd += ['-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-vcodec', 'libx264', '-pix_fmt', 'yuv420p']
+        cmd.append(self.output)
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+
+    def _write_gif_frame(self, image):
+        frame = Image.fromarray(image).quantize(256, method=Image.Quantize.FASTOCTREE)
+        if self.nframes == 0:
+            header = GifImagePlugin.getheader(frame, None, {'loop': 0} if self.repeat else {})[0]
+            for chunk in header:
+                self._gif.write(chunk)
+        for chunk in GifImagePlugin.getdata(frame, (0, 0), duration=10*self.delay, include_color_table=True):
+            self._gif.write(chunk)
+
+    def add_image(self, image):
+        """
+        Append a (height, width, 3 or 4) image array. Floats are taken to be 0-1
+        (as from plt.imread of a PNG).
+        """
+        image = np.asarray(image)
+        if image.dtype != np.uint8:
+            image = (np.clip(image, 0, 1)*255).round().astype(np.uint8)
+        image = np.ascontiguousarray(image[:, :, :3])
+        height, width = image.shape[:2]
+        if self.size is None:
+            self._open(width, height)
+        elif (width, height) != self.size:
+            raise ValueError('Frame size %dx%d does not match the animation size %dx%d'
+                                %(width, height, self.size[0], self.size[1]))
+        if self._gif is not None:
+            self._write_gif_frame(image)
+        else:
+            self._proc.stdin.write(image.tobytes())
+        self.nframes = self.nframes + 1
+
+    def add_figure(self, fig):
+        """
+        Append a matplotlib figure as the next frame
+        """
+        self.add_image(figure_to_rgb(fig, self.dpi))
+
+    def close(self):
+        if self._gif is not None:
+            self._gif.write(b';') # gif trailer
+            self._gif.close()
+            self._gif = None
+        elif self._proc is not None:
+            self._proc.stdin.close()
+            if self._proc.wait() != 0:
+                raise RuntimeError('ffmpeg failed writing %s'%self.output)
+            self._proc = None
+        else:
+            return
+        print('Saved %s (%d frames)'%(self.output, self.nframes))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class FrameGrabber:
+    """
+    Writer stand-in that keeps the last frame as an RGB array, so pool workers
+    can hand frames back to the AnimationWriter in the parent process.
+    """
+
+    def __init__(self, dpi=150):
+        self.dpi = dpi
+        self.frame = None
+
+    def add_figure(self, fig):
+        self.frame = figure_to_rgb(fig, self.dpi).copy()
+
+
+class FrameCube:
+    """
+    All the frames of an animation as one preallocated uint8 array of shape
+    (days, height, width, 3), memory-mapped from an .npy file. Frames are
+    written into their own slice, so pool workers can each fill different
+    days straight into the file and hand back nothing but the day index.
+    The animation is then encoded in one pass, a frame at a time. Only the
+    pages being written or read are held in memory, however long the series.
+
+    Example usage:
+        frames = FrameCube('DATA/cache/frames/COVID-19_UK.npy', shape=(len(days), 900, 1500))
+        for date_time in days:
+            single_frame_plot(geodf,date_time,region_UK,maxval,writer=frames) # next day's slice
+        frames.encode('FIGURES/COVID-19_UK.gif')
+        frames.remove()
+
+    In another process, open the same file and write a given day:
+        FrameCube(fname).slot(i) --> writer for day i, e.g. for FrameEngine.plot_frame()
+    """
+
+    flush_every = 16 # frames written between flushes, so unwritten pages stay bounded
+
+    def __init__(self, fname, shape=None, dpi=150):
+        self.fname = fname
+        self.dpi = dpi
+        self.nframes = 0
+        self.nwritten = 0
+        if shape is None: # an existing cube
+            self.frames = np.load(fname, mmap_mode='r+')
+        else:
+            os.makedirs(os.path.dirname(fname) or '.', exist_ok=True)
+            self.frames = np.lib.format.open_memmap(fname, mode='w+', dtype=np.uint8, shape=tuple(shape)+(3,))
+
+    def add_image(self, image, index=None):
+        """
+        Write a (height, width, 3 or 4) uint8 image to day index, by default
+        the day after the last one added
+        """
+        if index is None:
+            index = self.nframes
+            self.nframes = self.nframes + 1
+        self.frames[index] = image[:, :, :3] # raises if the frame size is not the cube's
+        self.nwritten = self.nwritten + 1
+        if self.nwritten % self.flush_every == 0:
+            self.flush()
+        return index
+
+    def add_figure(self, fig):
+        """
+        Write a matplotlib figure as the next day's frame
+        """
+        return self.add_image(figure_to_rgb(fig, self.dpi))
+
+    def slot(self, index):
+        return FrameSlot(self, index)
+
+    def flush(self):
+        self.frames.flush()
+
+    def encode(self, output, delay=100, repeat=True):
+        """
+        Encode the frames, in day order, into an animated .gif or .mp4 (see
+        AnimationWriter). Returns the animation filename.
+        """
+        self.flush()
+        with timed('encode frame cube'):
+            with AnimationWriter(output, delay=delay, dpi=self.dpi, repeat=repeat) as writer:
+                for frame in self.frames:
+                    writer.add_image(frame)
+        return output
+
+    def remove(self):
+        """
+        Unmap and delete the .npy file
+        """
+        self.frames = None # views of it in other FrameCube objects keep working until dropped
+        os.remove(self.fname)
+
+
+class FrameSlot:
+    """
+    Writer stand-in that puts a figure in one day's slice of a FrameCube
+    """
+
+    def __init__(self, cube, index):
+        self.cube = cube
+        self.index = index
+
+    def add_figure(self, fig):
+        self.cube.add_image(figure_to_rgb(fig, self.cube.dpi), self.index)
+
+
+def make_gif(files,output,delay=100, repeat=True,**kwargs):
+    """
+    Produce an animated .gif (or .mp4) from a list of picture files.
+    The pictures are read and encoded one at a time (see AnimationWriter).
+    make_gif(files,'FIGURES/COVID-19_NW.gif',delay=20)
+    """
+    with AnimationWriter(output, delay=delay, repeat=repeat) as writer:
+        for f in files:
+            writer.add_image(plt.imread(f))
+    return
+
+def plot_logy_with_fit( days, val, label='label for legend', col='g', ndays=13):
+    """
+    plot the variable against time on logy axis
+    Plot a straight line fit on logy axis
+    ndays - last ndays to fit data to
+    """
+
+    idays = np.arange(len(days))
+
+    plt.semilogy( days, val, 'o', label=label , color=col)
+
+    p = np.polyfit(idays[-ndays::] , np.log( val[val.index[-ndays::]] ), 1)
+    double_rate_str = '{0:3.1f}'.format(np.log(2)/p[0])
+    plt.semilogy(days[val.index[-ndays::]], np.exp(p[0] * idays[-ndays::] + p[1]),
+            '--', color=col, label='Fitted x2 rate = '+double_rate_str+' days')
+
+    return plt
+
+class RenderManifest:
+    """
+    Record of the map frames already drawn. For each (region, day) it keeps
+    a hash of the data drawn, the maxval of the colour scale, the render
+    options and the PNG file. A frame only needs drawing again if its data,
+    colour scale or render options (e.g. raster, lod) have changed, or its
+    file has gone (or been overwritten by another day's frame). Kept as JSON
+    in RENDER_MANIFEST.
+
+    Example usage:
+        manifest = RenderManifest()
+        if manifest.stale('London', date_time, fname, maxval, values):
+            single_frame_plot(geodf, date_time, region_Lon, maxval)
+            manifest.record('London', date_time, fname, maxval, values)
+        manifest.save()
+    values can be an array or a tuple of arrays, everything the frame is drawn from.
+    options is a dict of the settings that change how it is drawn, e.g.
+        manifest.stale('London', date_time, fname, maxval, values, options={'raster': True})
+    """
+
+    def __init__(self, fname=None):
+        self.fname = fname or RENDER_MANIFEST
+        self.frames = {} # 'region/YYYY-mm-dd' --> {'hash', 'maxval', 'options', 'file'}
+        self.files = {}  # PNG file --> the frame key that last wrote it
+        if os.path.exists(self.fname):
+            with open(self.fname) as f:
+                saved = json.load(f)
+            self.frames = saved['frames']
+            self.files = saved['files']
+
+    @staticmethod
+    def key(region_name, date_time):
+        return region_name+'/'+date_time.strftime('%Y-%m-%d')
+
+    @staticmethod
+    def data_hash(values):
+        if not isinstance(values, tuple):
+            values = (values,)
+        sha = hashlib.sha1()
+        for part in values:
+            part = np.asarray(part)
+            if part.dtype == object:
+                part = part.astype(str)
+            sha.update(str(part.shape).encode('utf-8'))
+            sha.update(np.ascontiguousarray(part).tobytes())
+        return sha.hexdigest()
+
+    def stale(self, region_name, date_time, fname, maxval, values, options=None):
+        """
+        True if the frame needs drawing
+        """
+        key = self.key(region_name, date_time)
+        entry = self.frames.get(key)
+        return (entry is None
+                or entry['maxval'] != float(maxval)
+                or entry.get('options', {}) != (options or {})
+                or entry['hash'] != self.data_hash(values)
+                or entry['file'] != fname
+                or self.files.get(fname) != key
+                or not os.path.exists(fname))
+
+    def record(self, region_name, date_time, fname, maxval, values, options=None):
+        key = self.key(region_name, date_time)
+        self.frames[key] = {'hash': self.data_hash(values), 'maxval': float(maxval), 'options': options or {},
+                            'file': fname}
+        self.files[fname] = key
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.fname) or '.', exist_ok=True)
+        tmp = self.fname+'.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'frames': self.frames, 'files': self.files}, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.fname) # never leave a half written manifest
+        return
+
+
+def _init_frame_worker(geodf):
+    """
+    Process pool initializer. The geodataframe is pickled once per worker
+    (rather than once per frame) and kept as a module global in that worker.
+    """
+    global _worker_geodf
+    plt.switch_backend('Agg') # workers have no display
+    _worker_geodf = geodf
+    return
+
+
+def _frame_worker(job):
+    """
+    Render one (day, region) frame in a pool worker. Returns the PNG filename,
+    or with movie the frame as an RGB array.
+    With reuse_figure (or raster) each worker keeps one FrameEngine per (region, maxval, raster, lod, fname_datefmt).
+    With slot = (cube filename, day index) the frame is written into that
+    day of the FrameCube and only the index is returned.
+    """
+    date_time, region, maxval, reuse_figure, movie, raster, lod, fname_datefmt, slot = job
+    grabber = FrameGrabber() if movie else None
+    if slot is not None:
+        cube_fname, index = slot
+        if cube_fname not in _worker_cubes:
+            _worker_cubes[cube_fname] = FrameCube(cube_fname)
+        grabber = _worker_cubes[cube_fname].slot(index)
+    if reuse_figure or raster:
+        key = (region['name'], maxval, raster, lod, fname_datefmt)
+        if key not in _worker_engines:
+            _worker_engines[key] = FrameEngine(_worker_geodf, region, maxval, raster=raster, lod=lod,
+                                                fname_datefmt=fname_datefmt)
+        fname = _worker_engines[key].plot_frame(date_time, writer=grabber)
+    else:
+        fname = single_frame_plot(_worker_geodf, date_time, region, maxval, writer=grabber, lod=lod,
+                                    fname_datefmt=fname_datefmt)
+        plt.close('all') # workers render many frames, don't let figures pile up
+
+    if slot is not None:
+        return index
+    if movie:
+        return grabber.frame
+    return fname
+
+
+_worker_engines = {} # FrameEngine instances held by a pool worker
+_worker_cubes = {} # FrameCube files opened by a pool worker
+
+
+def plot_frames_to_file(geodf, regions, days, nworkers=1, reuse_figure=False, movie=None, manifest=None, raster=False,
+                            cube=False, lod=False):
+    """
+    days = ['07', '08', '09', '10', '11', '12', '13']
+    regions = [ {'name': 'NW', 'xlim':[-3.4,-1.9], 'ylim':[52.8,53.9], 'date_loc':[-3.35, 53.8] } ]
+    Useage:     plot_all_frames_to_file(geodf,regions,days)
+
+    nworkers > 1 spreads the frames over a pool of processes. Each worker gets
+    its own copy of geodf once, at start up. Frames are collected in day order
+    so the returned file lists can go straight into make_gif().
+        files = plot_frames_to_file(geodf,regions,days,nworkers=4)
+        files['NW'] --> ['FIGURES/COVID-19_NW_07.png', ...]
+
+    PNG frames are named by day of the month, or by full date ("%Y%m%d",
+    e.g. FIGURES/COVID-19_NW_20200307.png) when that would give two days
+    the same file or with manifest.
+
+    reuse_figure=True draws each region's basemap once (see FrameEngine) and
+    only re-colours the polygons for each day.
+
+    raster=True (implies reuse_figure) draws the areas as an image coloured
+    from a cached area id raster (see label_grid) rather than as polygons.
+    It pays off for detailed boundaries only. A UK frame of the bundled
+    districts (12k vertices) takes 0.128 s against 0.103 s for polygons; of
+    a 664k vertex copy (shapely.segmentize to 0.0002 deg) 0.138 s against
+    0.251 s. Each region's label grids are made before its frames are
+    handed to the workers.
+
+    lod=True draws each region's boundaries simplified for its extent (see
+    GeometryLOD). The levels are made before any workers start.
+
+    movie='gif' or 'mp4' streams the frames straight into
+    FIGURES/COVID-19_<region>.gif (.mp4) with no PNG files. The returned
+    lists then hold the animation filename.
+
+    cube=True renders the frames into a memory-mapped FrameCube in
+    FRAME_CUBE_DIR (workers write their days straight into it), then encodes
+    the animation (movie, default 'gif') in one pass and deletes the cube.
+    Memory use does not grow with the number of days.
+        files = plot_frames_to_file(geodf,regions,days,nworkers=4,cube=True,movie='mp4')
+
+    manifest=True (or a RenderManifest) only draws the frames that are new or
+    have changed since the last run: a new day, revised data for the areas in
+    view, a region whose maxval (and so colour scale) has gone up, or a
+    change of reuse_figure, raster or lod. The
+    returned lists still hold every day's PNG, ready for make_gif().
+        files = plot_frames_to_file(geodf,regions,days,manifest=True) # daily refresh
+    """
+    from .geometry import find_max_in_region, region_query, geometry_lod
+    if manifest is True:
+        manifest = RenderManifest()
+    if cube and movie is None:
+        movie = 'gif'
+    if manifest is not None and movie is not None:
+        raise ValueError('manifest keeps PNG frames between runs. Use make_gif() on the returned files instead of movie or cube')
+    if movie is not None:
+        find_encoder('.'+movie) # before any frames are drawn
+    fname_datefmt = "%d"
+    if manifest is not None or len(set(date_time.day for date_time in days)) < len(days):
+        fname_datefmt = "%Y%m%d" # one file per day, also as the span grows past a month between runs
+
+    pool = None
+    if nworkers > 1:
+        if lod: # workers load the levels from LOD_DIR, rather than each making (and writing) them
+            geometry_lod(geodf).build(regions)
+        pool = multiprocessing.Pool(nworkers, initializer=_init_frame_worker, initargs=(geodf,))
+
+    all_files = {}
+    try:
+        for region in regions:
+
+            maxval = find_max_in_region(geodf,region,days) # Find the max value to construct the colorscale
+            print('Max val:',maxval)
+
+            todo = days
+            if manifest is not None:
+                options = {'reuse_figure': bool(reuse_figure or raster), 'raster': bool(raster), 'lod': bool(lod)}
+                fnames = [frame_filename(region, date_time, fname_datefmt) for date_time in days]
+                visible = region_query(geodf).overlapping(region)
+                drawn = timeseries_matrix(geodf.iloc[visible], days) # (areas in view x days)
+                todo = [date_time for i, date_time in enumerate(days)
+                            if manifest.stale(region['name'], date_time, fnames[i], maxval, drawn[:, i], options)]
+                print('%s: drawing %d of %d frames'%(region['name'], len(todo), len(days)))
+                count('frames up to date', len(days) - len(todo))
+
+            writer = None
+            frames = None
+            if cube:
+                # frames are (10.0, 6.0) inch figures saved at 150 dpi
+                frames = FrameCube(os.path.join(FRAME_CUBE_DIR, 'COVID-19_'+region['name']+'.npy'),
+                                    shape=(len(todo), int(6.0*150), int(10.0*150)))
+                writer = frames
+            elif movie is not None:
+                writer = AnimationWriter(os.path.join(settings.FIGURES_DIR, 'COVID-19_'+region['name']+'.'+movie))
+
+            if pool is None and (reuse_figure or raster):
+                engine = FrameEngine(geodf, region, maxval, raster=raster, lod=lod, fname_datefmt=fname_datefmt)
+                bins = engine.scale.bins( timeseries_matrix(geodf, todo) ) # (areas x days), all at once
+                files = [engine.plot_frame(date_time, writer=writer, bins=bins[:, i])
+                            for i, date_time in enumerate(todo)]
+                engine.close()
+            elif pool is None:
+                files = []
+                for date_time in  todo:
+                    files.append( single_frame_plot(geodf,date_time,region,maxval,writer=writer,lod=lod,
+                                                        fname_datefmt=fname_datefmt) )
+                    if len(todo)>6:
+                        plt.close('all')
+            else:
+                if raster: # make the label grids (kept in LABEL_DIR) once, before the workers need them
+                    FrameEngine(geodf, region, maxval, raster=True, lod=lod).close()
+                jobs = [(date_time, region, maxval, reuse_figure, movie is not None and frames is None, raster, lod,
+                            fname_datefmt, None if frames is None else (frames.fname, i)) for i, date_time in enumerate(todo)]
+                chunksize = max(1, len(jobs) // (4*nworkers))
+                files = []
+                if frames is not None:
+                    # each frame is already in its slice of the cube, any order will do
+                    for result in pool.imap_unordered(_frame_worker, jobs, chunksize=chunksize):
+                        pass
+                else:
+                    # imap returns results in the order of jobs, i.e. in day order
+                    for result in pool.imap(_frame_worker, jobs, chunksize=chunksize):
+                        if writer is not None:
+                            writer.add_image(result) # encode as they arrive
+                        else:
+                            files.append(result)
+
+            if frames is not None:
+                try:
+                    files = [frames.encode(os.path.join(settings.FIGURES_DIR, 'COVID-19_'+region['name']+'.'+movie))]
+                finally:
+                    frames.remove() # a year of frames is GBs, don't leave it behind if encoding fails
+            elif writer is not None:
+                writer.close()
+                files = [writer.output]
+            if manifest is not None:
+                for i, date_time in enumerate(days):
+                    if date_time in todo:
+                        manifest.record(region['name'], date_time, fnames[i], maxval, drawn[:, i], options)
+                manifest.save() # after each region, so an interrupted run keeps what it drew
+                files = fnames
+            all_files[region['name']] = files
+
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return all_files
+
+
+def extract_timeseries(geodf,days):
+    """
+    Extract and plot the growth rates of reported cases
+    """
+    kw_source_label = {'fontname':'Arial', 'size':'6', 'color':'black', 'weight':'normal',
+                'horizontalalignment': 'right', 'verticalalignment':'top'}
+    kw_sourcegit_label = {'fontname':'Arial', 'size':'6', 'color':'black', 'weight':'normal',
+                'horizontalalignment': 'left', 'verticalalignment':'top'}
+
+    names = geodf.index
+
+    time_series = timeseries_matrix(geodf, days) # (names x days)
+
+    # plot timeseries on log scale
+    threshold_to_plot = 30 # activate plotting
+    fig, ax = plt.subplots(1, 1)
+    plt.rcParams['figure.figsize'] = (10.0, 6.0)
+    to_plot = (time_series[:,-1]>threshold_to_plot) & (time_series[:,0]>1)
+    for n in np.flatnonzero(to_plot):
+        plt.semilogy( days, time_series[n,:], label=names[n] )
+
+
+    plt.semilogy(days, 5*doubling(days,2), 'k', linewidth=2, label='doubling rate = 2 day' )
+    plt.semilogy(days, 5*doubling(days,3), 'k', linewidth=3, label='doubling rate = 3 days' )
+    plt.semilogy(days, 5*doubling(days,5), 'k', linewidth=5, label='doubling rate = 5 days' )
+    #plt.set_yscale('log')
+
+    plt.legend(loc='best', # bbox_to_anchor=(-0.5, 0.95),
+          ncol=2, fancybox=True, shadow=True)
+
+    plt.xlabel('date')
+    plt.title('Analysis of confirmed cases in England for 10 top regions')
+    plt.ylabel('Total number of confirmed cases')
+    #plt.legend(location='outer');
+
+    sourcePHEstr = 'data source: www.gov.uk/government/publications/covid-19-track-coronavirus-cases'
+    sourceGITstr = 'https://github.com/jpolton/COVID-19'
+
+    plt.text(days[-1], 1, sourcePHEstr, **kw_source_label )
+    plt.text(days[0], 1, sourceGITstr, **kw_sourcegit_label )
+
+
+    fname = os.path.join(settings.FIGURES_DIR, 'doubling_rate_England.png')
+    print('Saving %s'%fname)
+    plt.savefig(fname, dpi=150)
+
+
+    return
+
+
+def double_rate_uk_totals():
+    totals = load_tomwhite_uktotals()
+
+    sourceDATAstr = 'data: github.com/tomwhite/covid-19-uk-data'
+    sourceGITstr = 'code: github.com/jpolton/COVID-19'
+
+    # Set the font dictionaries (for plot title and axis titles)
+    kw_sourcedata_label = {'fontname':'Arial', 'size':'8', 'color':'black', 'weight':'normal',
+                'horizontalalignment': 'left', 'verticalalignment':'top'}
+    kw_sourcegit_label = {'fontname':'Arial', 'size':'8', 'color':'black', 'weight':'normal',
+                'horizontalalignment': 'right', 'verticalalignment':'top'}
+
+    days = totals['Date']
+    idays = np.arange(len(days))
+
+    fig, ax = plt.subplots(1, 1)
+    plt.rcParams['figure.figsize'] = (10.0, 6.0)
+
+    plot_logy_with_fit( days, totals['Tests'], label='COVID-19 Tests', col='b', ndays=18)
+    plot_logy_with_fit( days, totals['ConfirmedCases'], label='Confirmed Cases', col='g', ndays=18)
+    plot_logy_with_fit( days, totals['Deaths'], label='Deaths', col='r', ndays=7)
+    plt.xlim([datetime.datetime(2020,3,1), days[totals.index[-1]] ])
+    plt.ylabel('Count')
+    plt.xlabel('Date')
+    plt.text(plt.gca().get_xlim()[0], plt.gca().get_ylim()[1], sourceGITstr, **kw_sourcedata_label )
+    plt.text(plt.gca().get_xlim()[1], plt.gca().get_ylim()[1], sourceDATAstr, **kw_sourcegit_label )
+    plt.title('COVID-19: Doubling rates for UK tests, confirmed cases and deaths')
+
+    myFmt = DateFormatter("%d %b")
+    ax.xaxis.set_major_formatter(myFmt)
+
+    ## Rotate date labels automatically
+    fig.autofmt_xdate()
+
+    plt.legend()
+
+    fname = os.path.join(settings.FIGURES_DIR, 'uk_totals.png')
+    print('Saving %s'%fname)
+    plt.savefig(fname, dpi=150)
+
+    plt.show()
+
+    return
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Settings: cache locations, render options and area merges. Most can be set
+from COVID19_* environment variables before the first import.
+"""
+
+import os
+
+## SETTINGS
+############################################################################
+
+# Where maps, charts and animations are saved
+FIGURES_DIR = os.environ.get('COVID19_FIGURES_DIR', 'FIGURES')
+# Local store for downloaded CSV files. See cached_csv()
+CACHE_DIR = os.environ.get('COVID19_CACHE_DIR', 'DATA/cache')
+CACHE_TTL = float(os.environ.get('COVID19_CACHE_TTL', 6*3600)) # seconds before re-checking the source
+OFFLINE = os.environ.get('COVID19_OFFLINE', '0') == '1' # only ever use cached copies
+# Binary snapshots of pivoted case tables. See snapshot_table()
+SNAPSHOT_DIR = os.path.join(CACHE_DIR, 'snapshots')
+# Merged and reprojected boundary geodataframes. See cached_geodataframe()
+GEOMETRY_DIR = os.path.join(CACHE_DIR, 'geometry')
+# Simplified boundaries for each level of detail. See GeometryLOD
+LOD_DIR = os.path.join(GEOMETRY_DIR, 'lod')
+# Simplification tolerances (degrees) of the levels of detail, finest first
+LOD_TOLERANCES = [0.0005, 0.001, 0.002, 0.004, 0.008]
+# Area id rasters for the raster render mode. See label_grid()
+LABEL_DIR = os.path.join(GEOMETRY_DIR, 'labels')
+# Memory-mapped (days, height, width, 3) frame arrays for animations. See FrameCube
+FRAME_CUBE_DIR = os.path.join(CACHE_DIR, 'frames')
+# GeoJSON responses from ArcGIS boundary queries. See ArcGISFetcher
+ARCGIS_DIR = os.path.join(CACHE_DIR, 'arcgis')
+# Frames already drawn, with the data and colour scale they were drawn from. See RenderManifest
+RENDER_MANIFEST = os.path.join(CACHE_DIR, 'render_manifest.json')
+
+# Areas whose cases are reported together: merged name --> the areas (and
+#  boundary polygons) it is made of. Drives both merge_areas() for the case
+#  data and dissolve_areas() for the shapefiles, so the two always agree.
+AREA_MERGES = {
+    'Bournemouth, Christchurch and Poole': ['Bournemouth', 'Poole'], # Christchurch is missing from the shapefile and is in the Dorset polygon.
+    'Cornwall and Isles of Scilly': ['Cornwall', 'Isles of Scilly'],
+    'Hackney and City of London': ['Hackney', 'City of London'],
+    }
+
+# Stage timings and counters, written to this .json or .csv file at exit (empty for none). See timed()
+TIMING_REPORT = os.environ.get('COVID19_TIMING_REPORT', '')
+# Opt-in cProfile of entry scripts, saved in PROFILE_DIR. See profile_script()
+PROFILE = os.environ.get('COVID19_PROFILE', '0') == '1'
+PROFILE_DIR = os.environ.get('COVID19_PROFILE_DIR', os.path.join(CACHE_DIR, 'profiles'))
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Stage timings, counters and the opt-in cProfile hook. See timed()
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import atexit # write the timing report at the end of a run
+import cProfile
+import pstats
+import contextlib
+import threading
+import datetime
+import pandas as pd # read in CSV data
+
+from .settings import PROFILE, PROFILE_DIR, TIMING_REPORT
+
+## FUNCTIONS
+############################################################################
+
+_timings = {}  # stage --> {'calls', 'total', 'max'} seconds
+_counters = {} # name --> count
+_timing_lock = threading.Lock() # ArcGIS queries are timed from several threads
+
+
+@contextlib.contextmanager
+def timed(stage):
+    """
+    Time a pipeline stage and add it to the stage's totals in the timing
+    report. Use as a context manager or as a function decorator. Stages can
+    nest, e.g. savefig time is also part of single_frame_plot. Frames drawn
+    in pool workers are timed in the workers and not reported.
+        with timed('join cases to geometry'):
+            ...
+        @timed('find_max_in_region')
+        def find_max_in_region(geodf,region,days):
+    """
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        with _timing_lock:
+            entry = _timings.setdefault(stage, {'calls': 0, 'total': 0., 'max': 0.})
+            entry['calls'] = entry['calls'] + 1
+            entry['total'] = entry['total'] + elapsed
+            entry['max'] = max(entry['max'], elapsed)
+
+
+def count(name, n=1):
+    """
+    Add n to a counter in the timing report, e.g. count('frames drawn')
+    """
+    with _timing_lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def timing_report():
+    """
+    DataFrame of the stage timings so far (calls, total, mean and max seconds),
+    slowest stage first, and the counters (in calls)
+    """
+    with _timing_lock:
+        rows = [{'name': stage, 'kind': 'stage', 'calls': t['calls'], 'total': t['total'],
+                    'mean': t['total']/t['calls'], 'max': t['max']} for stage, t in _timings.items()]
+        rows.sort(key=lambda row: -row['total'])
+        rows = rows + [{'name': name, 'kind': 'counter', 'calls': n} for name, n in sorted(_counters.items())]
+    return pd.DataFrame(rows, columns=['name', 'kind', 'calls', 'total', 'mean', 'max'])
+
+
+def write_timing_report(fname=None):
+    """
+    Print the timing report and write it to fname (default TIMING_REPORT):
+    JSON for .json, with the script and finish time so runs can be compared,
+    otherwise CSV with one row per stage or counter.
+        COVID19_TIMING_REPORT=FIGURES/timings.json python covid19_maps.py
+    """
+    fname = fname or TIMING_REPORT
+    report = timing_report()
+    print('%-40s %7s %10s %10s'%('stage', 'calls', 'total (s)', 'max (s)'))
+    for row in report.itertuples():
+        if row.kind == 'stage':
+            print('%-40s %7d %10.3f %10.3f'%(row.name, row.calls, row.total, row.max))
+        else:
+            print('%-40s %7d'%(row.name, row.calls))
+    if not fname:
+        return report
+    os.makedirs(os.path.dirname(fname) or '.', exist_ok=True)
+    if fname.endswith('.json'):
+        with open(fname, 'w') as f:
+            json.dump({'script': os.path.basename(sys.argv[0]),
+                       'finished': datetime.datetime.now().isoformat(timespec='seconds'),
+                       'stages': {row['name']: {key: row[key] for key in ['calls', 'total', 'mean', 'max']}
+                                    for row in report.to_dict('records') if row['kind'] == 'stage'},
+                       'counters': dict(_counters)}, f, indent=1)
+    else:
+        report.to_csv(fname, index=False, quoting=csv.QUOTE_NONNUMERIC)
+    print('Saved timing report %s'%fname)
+    return report
+
+
+def _report_at_exit():
+    if TIMING_REPORT and (_timings or _counters):
+        write_timing_report(TIMING_REPORT)
+
+atexit.register(_report_at_exit)
+
+
+def profile_script(name):
+    """
+    Opt-in cProfile hook for an entry script. With COVID19_PROFILE=1 the rest
+    of the run is profiled, the stats are saved at exit to
+    PROFILE_DIR/<name>_<YYYYmmdd-HHMMSS>.prof (for pstats or snakeviz) and the
+    20 slowest calls by cumulative time are printed. Otherwise does nothing.
+        c19.profile_script('covid19_maps')
+    """
+    if not PROFILE:
+        return None
+    profiler = cProfile.Profile()
+
+    def finish():
+        profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        fname = os.path.join(PROFILE_DIR, '%s_%s.prof'%(name, datetime.datetime.now().strftime('%Y%m%d-%H%M%S')))
+        profiler.dump_stats(fname)
+        print('Saved profile %s'%fname)
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+
+    atexit.register(finish)
+    profiler.enable()
+    return profiler
@@ -48,7 +48,7 @@ import matplotlib.cm as cm   # colormap functionality
 import matplotlib.colors as mcolors # make new colormap
 from matplotlib.dates import DateFormatter # format x-axis dates
 
-import os # make animation using system call "convert"
+import os
 import datetime
 import numpy as np
 import geopandas as gpd
@@ -63,6 +63,7 @@ import covid19_fns as c19
 ## Now do the main routine stuff
 if __name__ == '__main__':
     print(__name__)
+    c19.profile_script('covid19_maps') # COVID19_PROFILE=1 to profile the run
     # # Define Regions for plotting
     region_Eng = {'name': 'England', 'xlim':[-6,2], 'ylim':[50,56], 'date_loc':[0, 55.5] }
     region_NW = {'name': 'NW', 'xlim':[-3.4,-1.9], 'ylim':[52.8,53.9], 'date_loc':[-3.35, 53.8] }
@@ -101,6 +102,12 @@ if __name__ == '__main__':
     #c19.plot_frames_to_file(geodf,[region_Eng],days) # A single region and all day
     c19.plot_frames_to_file(geodf,[region_Lon],days) # A single region and all day
     c19.plot_frames_to_file(geodf,[region_NW],days) # A single region and all day
+    #c19.plot_frames_to_file(geodf,regions,days,nworkers=4) # All regions and all days, over 4 processes
+    #c19.plot_frames_to_file(geodf,regions,days,reuse_figure=True) # Draw each basemap once, recolour per day
+    #c19.plot_frames_to_file(geodf,regions,days,reuse_figure=True,movie='gif') # Straight to FIGURES/COVID-19_<region>.gif
+    #c19.plot_frames_to_file(geodf,regions,days,manifest=True) # Daily refresh: only draw new or changed frames
+    #c19.plot_frames_to_file(geodf,regions,days,raster=True) # Areas drawn as one image from a cached label grid
+    #c19.plot_frames_to_file(geodf,regions,days,nworkers=4,cube=True,movie='mp4') # Frames into a memory-mapped cube, encoded in one pass
     #c19.plot_frames_to_file(geodf,regions,[days[-1]]) # All regions, last day
     #plot_frames_to_file(geodf,[region_Lon],[days[-1]]) # All regions, last day
 
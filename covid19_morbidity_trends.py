@@ -12,6 +12,7 @@ What does it look like without smoothing?
 """
 
 
+import matplotlib # colormap registry
 import matplotlib.pyplot as plt # plotting
 import matplotlib.cm as cm   # colormap functionality
 #import matplotlib.colors as mcolors # make new colormap
@@ -23,23 +24,23 @@ import numpy as np
 #import geopandas as gpd
 import pandas as pd # read in CSV data
 
-#import covid19_fns as c19
+import covid19_fns as c19
 
 
 
 ##########################################################################################################################
 ## Now do the main routine stuff
 if __name__ == '__main__':
+    c19.profile_script('covid19_morbidity_trends') # COVID19_PROFILE=1 to profile the run
 
     url = 'https://raw.githubusercontent.com/emmadoughty/Daily_COVID-19/master/Data/COVID19_by_day.csv'
-    mydateparser = lambda x: datetime.datetime.strptime(x, "%d/%m/%Y")
-    covid = pd.read_csv(url,parse_dates=[0], date_parser=mydateparser)
+    covid = c19.read_dated_csv(c19.cached_csv(url), "%d/%m/%Y")
     color = covid['Date'].dt.dayofweek
 
     plt.close('all')
     fig, (ax2, ax1) = plt.subplots(2,1, figsize=(8,8))
     lg = ax2.scatter(covid['CumDeaths'], covid['NewDeaths'], c=color,
-        cmap=cm.get_cmap('PiYG', 7),
+        cmap=matplotlib.colormaps['PiYG'].resampled(7),
         vmin = -0.5, vmax = 6.5 )
     ax2.set_ylabel('New Deaths')
     ax2.set_xlabel('Cumulative Deaths')
@@ -49,7 +50,7 @@ if __name__ == '__main__':
     ax2.set_title('UK COVID19: New daily deaths vs total deaths coloured by reported day')
 
     ax1.scatter(covid['CumDeaths'], covid['NewDeaths'], c=color,
-            cmap=cm.get_cmap('PiYG', 7),
+            cmap=matplotlib.colormaps['PiYG'].resampled(7),
             vmin = -0.5, vmax = 6.5 )
     ax1.set_ylabel('New Deaths')
     ax1.set_xlabel('Cumulative Deaths')
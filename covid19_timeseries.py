@@ -51,7 +51,6 @@ from matplotlib.dates import DateFormatter # format x-axis dates
 import os # make animation using system call "convert"
 import datetime
 import numpy as np
-import geopandas as gpd
 import pandas as pd # read in CSV data
 
 import covid19_fns as c19
@@ -62,6 +61,7 @@ import covid19_fns as c19
 ##########################################################################################################################
 ## Now do the main routine stuff
 if __name__ == '__main__':
+    c19.profile_script('covid19_timeseries') # COVID19_PROFILE=1 to profile the run
     # # Define Regions for plotting
     region_Eng = {'name': 'England', 'xlim':[-6,2], 'ylim':[50,56], 'date_loc':[0, 55.5] }
     region_NW = {'name': 'NW', 'xlim':[-3.4,-1.9], 'ylim':[52.8,53.9], 'date_loc':[-3.35, 53.8] }
@@ -101,3 +101,8 @@ if __name__ == '__main__':
 
     ## Plot the growth rate of conformed cases for reporting areas
     c19.extract_timeseries(geodf,days)
+
+    ## Export growth rates and doubling times for all reporting areas
+    #c19.growth_analysis(geodf,days).to_csv('growth_rates.csv', index=False)
+    #c19.doubling_times(geodf,days,ndays=7).to_csv('doubling_times.csv')
+    #c19.rolling_doubling_times(geodf,days,window=7).to_csv('rolling_doubling_times.csv', index=False)
@@ -8,6 +8,7 @@
 from mpl_toolkits.axes_grid1.inset_locator import zoomed_inset_axes # inset plot
 from mpl_toolkits.axes_grid1.inset_locator import mark_inset # inset plot
 
+import matplotlib # colormap registry
 import matplotlib.pyplot as plt # plotting
 import matplotlib.cm as cm   # colormap functionality
 import matplotlib.colors as mcolors # make new colormap
@@ -33,14 +34,25 @@ class ReportingRegion_shp:
 
     url_tail = "%25'&outFields=*&outSR=4326&f=json"
 
-    def __init__(self, ONScode):
+    file_S = 'DATA/SG_NHS_HealthBoards_2019/SG_NHS_HealthBoards_2019.shp'
+    file_N = 'DATA/OSNI_Open_Data__Largescale_Boundaries__Local_Government_Districts_2012/OSNI_Open_Data__Largescale_Boundaries__Local_Government_Districts_2012.shp' # https://www.opendatani.gov.uk/dataset/osni-open-data-largescale-boundaries-local-government-districts-2012
+
+    def __init__(self, ONScode, shp=None, name=None):
+        """
+        Load the geometry for ONScode. If shp (and name) are given, e.g. by a
+        RegionRegistry, they are used as they are and nothing is read.
+        """
         self.ONScode = str(ONScode)
         #self.date_time = date_time
-        #self.value = np.NaN
+        #self.value = np.nan
 
         # load ONScode geometry
-        if self.ONScode[0].upper() == 'S':
-            file = 'DATA/SG_NHS_HealthBoards_2019/SG_NHS_HealthBoards_2019.shp'
+        if shp is not None:
+            self.shp = shp
+            self.name = name
+
+        elif self.ONScode[0].upper() == 'S':
+            file = ReportingRegion_shp.file_S
             shp = gpd.read_file(file).to_crs("EPSG:4326") # Lots of region (in degrees)
             self.shp = shp[ shp['HBCode'] == ONScode ] # extract one region
             # ONS code region name
@@ -48,7 +60,7 @@ class ReportingRegion_shp:
             self.name = self.shp.HBName.values[0]
 
         elif self.ONScode[0].upper() == 'N':
-            file = 'DATA/OSNI_Open_Data__Largescale_Boundaries__Local_Government_Districts_2012/OSNI_Open_Data__Largescale_Boundaries__Local_Government_Districts_2012.shp' # https://www.opendatani.gov.uk/dataset/osni-open-data-largescale-boundaries-local-government-districts-2012
+            file = ReportingRegion_shp.file_N
             shp = gpd.read_file(file).to_crs("EPSG:4326") # Lots of region (in degrees)
             self.shp = shp[ shp['LGDCode'] == ONScode ] # extract one region
             # ONS code region name
@@ -84,11 +96,83 @@ class ReportingRegion_shp:
         print(f"{self.ONScode} : {self.name}")
 
 
+class RegionRegistry:
+    """
+    Load the geometry for many ONS codes in one pass and hand out
+    ReportingRegion_shp views of it.
+
+    The Scottish Health Board and NI LGD shapefiles are each read and
+    reprojected once. The remaining codes are looked up with batched ArcGIS
+    queries, all endpoints at once (c19.ArcGISFetcher), rather than up to four
+    queries per code in turn. A code takes its geometry from the first
+    endpoint in url_head order that has it. Responses are cached on disk.
+
+    Example usage:
+        r = RegionRegistry().regions(ONScodes)
+        r['S08000026'].print()
+
+        # Offline, against a local stand-in server
+        with c19.MockArcGISServer(layers) as server:
+            r = RegionRegistry(url_base=[server.url+'/lad19/MapServer/0/query']).regions(ONScodes)
+    """
+
+    def __init__(self, fetcher=None, url_base=None):
+        self.index = dict() # ONScode: (geodataframe rows, name)
+        self.fetcher = fetcher if fetcher is not None else c19.ArcGISFetcher()
+        if url_base is None:
+            url_base = [head.split('?')[0] for head in ReportingRegion_shp.url_head]
+        self.url_base = url_base # query url for each of ReportingRegion_shp.url_key
+
+    def _add(self, gdf, key, nam):
+        """
+        Index the rows of gdf by their code in column key, in one pass
+        """
+        for code, rows in gdf.groupby(key):
+            self.index[code] = (rows, rows[nam].values[0])
+
+    def load(self, ONScodes):
+        """
+        Load geometry for every ONScode not already in the index
+        """
+        todo = [str(c) for c in ONScodes if str(c) not in self.index]
+
+        if any(c[0].upper() == 'S' for c in todo):
+            print('Load %s'%ReportingRegion_shp.file_S)
+            self._add( gpd.read_file(ReportingRegion_shp.file_S).to_crs("EPSG:4326"), 'HBCode', 'HBName' )
+        if any(c[0].upper() == 'N' for c in todo):
+            print('Load %s'%ReportingRegion_shp.file_N)
+            self._add( gpd.read_file(ReportingRegion_shp.file_N).to_crs("EPSG:4326"), 'LGDCode', 'LGDCode' )
+
+        todo = [c for c in todo if c[0].upper() not in 'SN']
+        if len(todo) > 0:
+            endpoints = list(zip(self.url_base, ReportingRegion_shp.url_key))
+            found = self.fetcher.find_all(todo, endpoints)
+            for code, (gdf, n) in found.items():
+                self.index[code] = (gdf, gdf[ReportingRegion_shp.url_nam[n]].values[0])
+            todo = [c for c in todo if c not in self.index]
+
+        for c in todo:
+            print('ONS code: {} not found'.format(c))
+        return
+
+    def regions(self, ONScodes):
+        """
+        Dictionary of ReportingRegion_shp, keyed by ONScode
+        """
+        self.load(ONScodes)
+        r = dict()
+        for ONScode in ONScodes:
+            if ONScode in self.index:
+                shp, name = self.index[ONScode]
+                r[ONScode] = ReportingRegion_shp( ONScode, shp=shp.copy(), name=name )
+        return r
+
+
 def add_value(data, region, date_time):
     """
     r[ONScode] = add_value(covid, r[ONScode] , date_time)
     """
-    region.value = np.NaN
+    region.value = np.nan
 
     # Find the valie for the date_time and ONScode
     region.value = data.loc[date_time, region.ONScode]
@@ -110,21 +194,31 @@ def load_tomwhite_covid_new():
     Date	Country	AreaCode	Area	TotalCases
     2020-03-05	England	E09000002	Barking and Dagenham	0
 
-    Pivot the data to rows of placenames and columns of dates
+    Pivot the data to rows of dates and columns of ONScodes. The CSV is
+    streamed in chunks into the pivoted table (c19.pivot_long_csv), dropping
+    rows with a blank AreaCode as it goes. The table is kept as a binary
+    snapshot (c19.snapshot_table) and only rebuilt when the download changes.
+    For one day at a time as the CSV is read, see c19.long_csv_days().
+
+    OUTPUT:
+        areas - table of AreaCode, Country and Area, one row per AreaCode (categories)
+        covid - table of TotalCases, Date x AreaCode (int32, or nullable Int32 with gaps)
     """
 
     url = 'https://raw.githubusercontent.com/tomwhite/covid-19-uk-data/master/data/covid-19-cases-uk.csv'
     print('Load COVID-19 data from %s'%url)
+    fname = c19.cached_csv(url)
 
-    mydateparser = lambda x: datetime.datetime.strptime(x, "%Y-%m-%d")
-    covid_raw = pd.read_csv(url,index_col=3,parse_dates=[0], date_parser=mydateparser)
+    def build():
+        covid, areas = c19.pivot_long_csv(fname)
+        #covid = covid.pivot(index='Date', columns='Area', values='TotalCases' )
 
-    covid_raw['AreaCode'].replace('', np.nan, inplace=True)
-    covid_raw.dropna(subset=['AreaCode'], inplace=True)
+        # Keep the area names and countries with the snapshot
+        covid.attrs['areas'] = areas.to_dict(orient='list')
+        return covid
 
-    #covid = covid.reset_index()
-    covid = covid_raw.pivot(index='Date', columns='AreaCode', values='TotalCases' )
-    #covid = covid.pivot(index='Date', columns='Area', values='TotalCases' )
+    covid = c19.snapshot_table('tomwhite_cases_by_code', fname, build)
+    areas = c19.compact_areas( pd.DataFrame(covid.attrs['areas']) ) # categorical AreaCode, Country, Area
 
     """
     ## Find rows where NaNs are lurking
@@ -133,7 +227,7 @@ def load_tomwhite_covid_new():
     rows_with_NaN
     """
 
-    return covid_raw, covid
+    return areas, covid
 
 
 
@@ -152,10 +246,10 @@ def make_colormap(type='log', N=11):
     # ##
 
     # Make a new colormap by adding colours together
-    blu_cmap=plt.cm.get_cmap('Blues', (N+1) // 2 )
-    red_cmap=plt.cm.get_cmap('Reds',  (N+1) // 2 )
-    pla_cmap=plt.cm.get_cmap('plasma', N+1 )
-    rnb_cmap=plt.cm.get_cmap('rainbow', N+1 )
+    blu_cmap=matplotlib.colormaps['Blues'].resampled((N+1) // 2)
+    red_cmap=matplotlib.colormaps['Reds'].resampled((N+1) // 2)
+    pla_cmap=matplotlib.colormaps['plasma'].resampled(N+1)
+    rnb_cmap=matplotlib.colormaps['rainbow'].resampled(N+1)
 
     white_pal = np.array([[1., 1., 1., 1.]])
     #grey_pal = np.array([[.8, .8, .8, 1.]])
@@ -181,30 +275,40 @@ def find_max_in_region(geodf,region):
     Find the largest cases value within a specified region and days list
     region_Lon = {'name': 'London',  'xlim':[-0.6,0.5], 'ylim':[51.2,51.8], 'date_loc':[0.2,51.75] }
     maxval = find_max_in_region(geodf,region_Lon,days)
+    The areas within the region come from the spatial index (c19.RegionQuery)
     """
-    from shapely.geometry import Polygon # Find max in region
-
-    ymin,ymax = region['ylim']
-    xmin,xmax = region['xlim']
-    lat_point_list = [ymin, ymax, ymax, ymin, ymin]
-    lon_point_list = [xmin, xmin, xmax, xmax, xmin]
+    region_geodf = geodf.iloc[ c19.region_query(geodf).positions(region) ]
 
-    polygon_geom = Polygon(zip(lon_point_list, lat_point_list))
-    # Define the region's boundary as a geodataframe (Coodinate Reference System in DEGREES)
-    boundary_geodf = gpd.GeoDataFrame(index=[0], crs="EPSG:4326", geometry=[polygon_geom])
-
-    # Now find the small polygons within this boundary
-    region_mask = geodf.within(boundary_geodf.loc[0, 'geometry'])
-    region_geodf = geodf.loc[region_mask]
+    return region_geodf.value.max() # Max over region
 
 
-    #print(boundary.geometry)
-    return region_geodf.value.max() # Max over region
 
 
+def snapshot_title(region):
+    """
+    Title and colorbar orientation for a region's snapshot frames
+    """
+    if region['name'] == 'London':
+        orientation_str='horizontal'
+        titlestr = 'COVID-19 total confirmed cases for London by local authority'
+    elif region['name'] == 'Wales':
+        titlestr = 'COVID-19 total confirmed cases for Wales by reporting region'
+        orientation_str='vertical'
+    elif region['name'] == 'Scotland':
+        titlestr = 'COVID-19 total confirmed cases for Scotland by Health Board'
+        orientation_str='vertical'
+    elif region['name'] == 'NW':
+        #titlestr = 'COVID-19 total confirmed cases for NW England and Wales by local authority'
+        titlestr = 'COVID-19 total confirmed cases for NW England by local authority'
+        orientation_str='vertical'
+    else:
+        #titlestr = 'COVID-19 total confirmed cases for England and Wales by local authority'
+        titlestr = 'COVID-19 total confirmed cases by reporting district'
+        orientation_str='vertical'
+    return titlestr, orientation_str
 
 
-def snapshot_plot(geodf_final,geodf,date_time,region,maxval=20.):
+def snapshot_plot(geodf_final,geodf,date_time,region,maxval=20.,writer=None,lod=None):
     """
     NEED TO UPDATE
 
@@ -215,6 +319,13 @@ def snapshot_plot(geodf_final,geodf,date_time,region,maxval=20.):
         maxval = 10.
         single_frame_plot(geodf,date_time,region_Lon,maxval)
     --> FIGURES/COVID-19_London_13.png
+
+    With writer (c19.AnimationWriter) the frame is streamed into the animation
+    instead of being saved as a PNG.
+
+    lod - c19.GeometryLOD of the geometry that geodf and geodf_final are rows
+    of. The main map is then drawn with boundaries simplified for its extent;
+    the zoomed insets keep the full boundaries.
     """
 
     #datestr = daystr + " March"
@@ -242,49 +353,30 @@ def snapshot_plot(geodf_final,geodf,date_time,region,maxval=20.):
 
     N = 13 # Number of rectangular colorbar elements
 
-    fig, ax = plt.subplots(1, 1) # dummy figure
-    plt.rcParams['figure.figsize'] = (10.0, 6.0) # dummy figure
-
-    fig, ax = plt.subplots(1, 1)
+    # One figure per frame: a dummy figure made first to set the size was never closed
+    fig, ax = plt.subplots(1, 1, figsize=(10.0, 6.0))
     plt.rcParams['figure.figsize'] = (10.0, 6.0)
+    map_final, map_geodf = geodf_final, geodf
+    if lod is not None: # simplified boundaries for the whole map view
+        map_final = lod.for_view(region, gdf=geodf_final)
+        map_geodf = lod.for_view(region, gdf=geodf)
     # plot the boundaries from a static datagrame (from final date)
-    geodf_final.boundary.plot( ax=ax, linewidth=0.25, color='k' ) # make boundaries grey when there are more reported areas
+    map_final.boundary.plot( ax=ax, linewidth=0.25, color='k' ) # make boundaries grey when there are more reported areas
 
     colorbar_extend_str = 'min'
-    geodf.plot(column='value', ax=ax, legend=False,
+    scale = c19.colour_scale(maxval, N, make_cmap=make_colormap) # cached per (maxval, N)
+    map_geodf.plot(column='value', ax=ax, legend=False,
             missing_kwds={'color': 'lightgray'},
-            cmap=make_colormap(type='log',N=N),
-            norm=mcolors.LogNorm(vmin=1, vmax=maxval) )
+            cmap=scale.cmap,
+            norm=scale.norm )
 
 
 
     # Edit and present colorbar
     axx=plt.gca()
-    if region['name'] == 'London':
-        orientation_str='horizontal'
-        titlestr = 'COVID-19 total confirmed cases for London by local authority'
-    elif region['name'] == 'Wales':
-        titlestr = 'COVID-19 total confirmed cases for Wales by reporting region'
-        orientation_str='vertical'
-    elif region['name'] == 'Scotland':
-        titlestr = 'COVID-19 total confirmed cases for Scotland by Health Board'
-        orientation_str='vertical'
-    elif region['name'] == 'NW':
-        #titlestr = 'COVID-19 total confirmed cases for NW England and Wales by local authority'
-        titlestr = 'COVID-19 total confirmed cases for NW England by local authority'
-        orientation_str='vertical'
-    else:
-        #titlestr = 'COVID-19 total confirmed cases for England and Wales by local authority'
-        titlestr = 'COVID-19 total confirmed cases by reporting district'
-        orientation_str='vertical'
+    titlestr, orientation_str = snapshot_title(region)
 
-    # Find base such that int(base**(N-1) = maxval
-    base = np.e**(np.log(maxval) /(N))
-    ticks = [int(base**i) for i in range(N+2) ]
-    ticks = list(set(ticks))
-    ticks.sort()
-    ticks = ticks[0:N+1]
-    print('Ticks: ',ticks)
+    ticks = scale.ticks
 
     cb=plt.colorbar(axx.collections[1], extend='max',
                             #norm=mcolors.LogNorm(vmin=0, vmax=maxval),
@@ -332,13 +424,13 @@ def snapshot_plot(geodf_final,geodf,date_time,region,maxval=20.):
         #r['S08000026'].shp.plot(ax= axins, edgecolor='black', color='white' )
         geodf_lon.plot(column='value', ax=axins1, legend=False,
                     missing_kwds={'color': 'lightgray'},
-                    cmap=make_colormap(type='log',N=N),
-                    norm=mcolors.LogNorm(vmin=1, vmax=maxval) )
+                    cmap=scale.cmap,
+                    norm=scale.norm )
 
         geodf_she.plot(column='value', ax=axins2, legend=False,
                     missing_kwds={'color': 'lightgray'},
-                    cmap=make_colormap(type='log',N=N),
-                    norm=mcolors.LogNorm(vmin=1, vmax=maxval) )
+                    cmap=scale.cmap,
+                    norm=scale.norm )
 
         plt.setp(axins1.get_xticklabels(), visible=False)
         plt.setp(axins1.get_yticklabels(), visible=False)
@@ -346,6 +438,10 @@ def snapshot_plot(geodf_final,geodf,date_time,region,maxval=20.):
         plt.setp(axins2.get_yticklabels(), visible=False)
 
     #fig.tight_layout()
+    if writer is not None:
+        writer.add_figure(fig)
+        return
+
     fname = 'FIGURES/COVID-19_'+region['name']+'_'+datestrfname+'.png'
     print('Saving %s'%fname)
     plt.savefig(fname, dpi=150)
@@ -356,16 +452,16 @@ def find_the_ONScodes_by_country(country_lst,data_raw):
     """
     INPUT:
         country_lst = ['England', 'Wales']. List of strings, name of country (string) in database.
-        data - pandas table of data (Orgin: TomWhite. URL: https://github.com/tomwhite/covid-19-uk-data/blob/master/data/covid-19-cases-uk.csv)
+        data - pandas table with Country and AreaCode columns (Orgin: TomWhite. URL: https://github.com/tomwhite/covid-19-uk-data/blob/master/data/covid-19-cases-uk.csv)
     OUTPUT:
         ONScdes - array of ONScode strings
 
-    ONScodes = find_the_ONScodes_by_country('Scotland',covid_raw)
+    ONScodes = find_the_ONScodes_by_country('Scotland',areas)
     """
     count = 0
     for country_str in country_lst:
         count = count + 1
-        codes = covid_raw.loc[covid_raw['Country'] == country_str].AreaCode.unique()
+        codes = np.asarray( data_raw.loc[data_raw['Country'] == country_str].AreaCode.unique() ) # plain array, also for categories
         if count == 1:
             ONScodes = codes
         else:
@@ -378,9 +474,19 @@ def daterange(start_date, end_date):
     for n in range(int ((end_date - start_date).days) + 1):
         yield end_date - datetime.timedelta(n)
 
+
+def regions_geodataframe(r, ONScodes):
+    """
+    One geodataframe of the geometry of all the regions, built in a single
+    concat, with an ONScode column
+    """
+    shps = [r[ONScode].shp.assign(ONScode=ONScode) for ONScode in ONScodes if ONScode in r]
+    return gpd.GeoDataFrame(pd.concat(shps, ignore_index=True), crs="EPSG:4326")
+
 ##########################################################################################################################
 ## Now do the main routine stuff
 if __name__ == '__main__':
+    c19.profile_script('test') # COVID19_PROFILE=1 to profile the run
 
     # # Define Regions for plotting
     region_UK = {'name': 'UK', 'country_lst':['England','Wales','Northern Ireland','Scotland'],
@@ -415,16 +521,19 @@ if len(regions) > 1:
 
 #days = [datetime.datetime(2020, 3, i) for i in range(7,31+1)]
 #days = [datetime.datetime(2020, 3, i) for i in range(28,31+1)]
-days = daterange(datetime.datetime(2020, 3, 7), datetime.datetime(2020, 4, 3) )
+days = sorted( daterange(datetime.datetime(2020, 3, 7), datetime.datetime(2020, 4, 3) ) )
 
 # load the raw COVID19 data
-covid_raw, covid = load_tomwhite_covid_new()
+areas, covid = load_tomwhite_covid_new()
 
 # Extra the ONScodes for the region of interest
-ONScodes = find_the_ONScodes_by_country(regions[0]['country_lst'],covid_raw)
+ONScodes = find_the_ONScodes_by_country(regions[0]['country_lst'],areas)
+
+# Define the polygon regions as class instances. Each geometry source is read once.
+r = RegionRegistry().regions(ONScodes)
 
 if(0):
-    # Define the polygon regions as class instanaces
+    # Define the polygon regions as class instanaces, one read per region (slow)
     r = dict() # Store all the regions in a dictionary
     for i in range( len(ONScodes) ):
         ONScode = ONScodes[i]
@@ -435,61 +544,82 @@ if(0):
 #date_time = datetime.datetime(2020,3,30)
 
 
-# REVIEW:
-df_final = None
+# Static geometry for all regions plus a (days x regions) matrix of cases
+tc = c19.TimeChoropleth.from_table( regions_geodataframe(r, ONScodes), covid, days, key='ONScode' )
 
-for date_time in days: # reverse order
+# The last day has the most reporting regions. Use it to plot the boundaries for all frames.
+df_final = tc.frame(days[-1])
 
-    gdf = None
-    df = None
-
-    for i in range( len(ONScodes) ):
-        ONScode = ONScodes[i]
-    #if name[0] != 'S': # Don't have the shape files for Scotland
-        #print('count: {}, ONScode: {}'.format(i,ONScode))
-        #r[ONScode] = ReportingRegion_shp( ONScode )
-        r[ONScode] = add_value(covid, r[ONScode] , date_time)
-        #r1.shp.plot(ax = ax, column='value' , legend=False, cmap = 'jet')
-        r[ONScode].print()
-        print('count:',i)
-        if gdf is None:
-            gdf = r[ONScode].shp
-        else:
-            gdf = gpd.GeoDataFrame( pd.concat([gdf, r[ONScode].shp]),  crs="EPSG:4326")
+# Simplified boundaries for zoomed out maps, made once (and kept in c19.LOD_DIR).
+#  Off by default: the maps then match the full boundary ones exactly
+simplify_boundaries = False
+lod = c19.geometry_lod(tc.geodf) if simplify_boundaries else None
 
+# Stream the frames, in date order, straight into an animated gif per region
+make_animation = True
+writers = dict()
+if make_animation:
+    writers = {region['name']: c19.AnimationWriter('FIGURES/COVID-19_%s.gif'%region['name'], delay=100)
+                for region in regions}
+engines = dict() # Maps without insets: draw once and recolour each day
 
-        # Take rows where value is not NaN
-        df = gdf[gdf['value'].notna()]
-        #df.reset_index(inplace=True)
-        #df = df.to_crs("EPSG:4326") # degrees
+# Daily refresh: keep the PNG frames and only redraw those whose data or colour
+#  scale has changed since the last run. The gif is then made from the PNGs.
+incremental = True
+manifest = c19.RenderManifest() if incremental else None
+render_options = {'lod': simplify_boundaries} # frames drawn with other options are redrawn
 
+for date_time in days:
 
-    # Save the first (last) datafraem to plot the boundaries for all frames.
-    try:
-        if df_final == None:
-            df_final = df
-    except:
-        pass
+    df = tc.frame(date_time)
 
     for region in regions:
-        maxval = find_max_in_region(df,region) # Find the max value to construct the colorscale
+        maxval = tc.max_in_region(region, date_time) # Find the max value to construct the colorscale
         print('maxval',maxval)
         maxval = max(maxval, 10)
+        writer = writers.get(region['name'])
+        if incremental:
+            fname = c19.frame_filename(region, date_time, "%Y%m%d")
+            # Every frame draws the day's values and the boundaries of the areas reporting on the last day
+            drawn = (tc.values_on(date_time), df_final['ONScode'].values)
+            if not manifest.stale(region['name'], date_time, fname, maxval, drawn, render_options):
+                if writer is not None:
+                    writer.add_image(plt.imread(fname))
+                continue
+            writer = None # save the PNG, added to the gif below
         try:
-            snapshot_plot(df_final,df,date_time,region,maxval)
+            if region['name'] == 'UK': # London and Shetland insets
+                snapshot_plot(df_final,df,date_time,region,maxval,writer=writer,lod=lod)
+            else:
+                if region['name'] not in engines:
+                    engines[region['name']] = c19.FrameEngine(tc.geodf, region, maxval,
+                                    boundary_geodf=df_final, make_cmap=make_colormap,
+                                    titlestr=snapshot_title(region)[0],
+                                    sourcestr='data: github.com/tomwhite/covid-19-uk-data',
+                                    fname_datefmt="%Y%m%d", lod=simplify_boundaries)
+                engines[region['name']].set_maxval(maxval)
+                engines[region['name']].plot_frame(date_time, values=tc.values_on(date_time),
+                                    writer=writer)
         except:
-            pass
+            continue
+        if incremental:
+            manifest.record(region['name'], date_time, fname, maxval, drawn, render_options)
+            if region['name'] in writers:
+                writers[region['name']].add_image(plt.imread(fname))
 
     #plt.show()
-    plt.close('all')
-
-
-if len(days)>6:
-
-    print('My imageMagick is broken, so to make an animated gif copy and paste:')
-    print('convert -geometry 2048x2048 -loop 0 -delay 100 COVID-19_%s_??.png COVID-19_%s.gif'%(region['name'],region['name']))
-
-print("convert -geometry 2048x2048 -loop 0 -delay 100 `ls -t COVID-19_UK*png` COVID-19_UK.gif")
+    # Close the snapshot figures, the engines keep theirs for the next day
+    engine_figs = [engine.fig.number for engine in engines.values()]
+    for num in plt.get_fignums():
+        if num not in engine_figs:
+            plt.close(num)
+
+for engine in engines.values():
+    engine.close()
+for writer in writers.values():
+    writer.close()
+if incremental:
+    manifest.save()
 
         #covid = covid.pivot(index='Area', columns='Date', values='TotalCases' )
 